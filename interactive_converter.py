@@ -7,11 +7,13 @@
 
 import os
 import sys
-import subprocess
 import argparse
 import time
 import threading
 import shutil
+import unicodedata
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
 
 # ANSI 颜色代码
 class Colors:
@@ -32,98 +34,112 @@ class Colors:
     BG_RED = '\033[41m'
     BG_YELLOW = '\033[43m'
 
-# 进度条动画
-class Spinner:
-    def __init__(self):
-        self.running = False
-        self.spinner_thread = None
-        self.message = ""
-        
-    def spin(self):
-        symbols = ['⠋', '⠙', '⠹', '⠸', '⠼', '⠴', '⠦', '⠧', '⠇', '⠏']
-        idx = 0
-        while self.running:
-            sys.stdout.write(f"\r{Colors.OKBLUE}{symbols[idx]} {self.message}{Colors.ENDC}")
-            sys.stdout.flush()
-            idx = (idx + 1) % len(symbols)
-            time.sleep(0.1)
-        sys.stdout.write("\r" + " " * (len(self.message) + 2) + "\r")
-        sys.stdout.flush()
-    
-    def start(self, message="处理中..."):
-        self.message = message
-        self.running = True
-        self.spinner_thread = threading.Thread(target=self.spin)
-        self.spinner_thread.daemon = True
-        self.spinner_thread.start()
+# 状态指示器：转圈动画和百分比进度条共用一个由Event驱动的刷新线程
+class StatusIndicator:
+    SPINNER_SYMBOLS = ['⠋', '⠙', '⠹', '⠸', '⠼', '⠴', '⠦', '⠧', '⠇', '⠏']
+    # 进度条模式下模拟进度时依次显示的阶段信息
+    STAGES = [
+        "解析笔记本结构...",
+        "处理单元格内容...",
+        "转换为HTML格式...",
+        "应用样式和主题...",
+        "渲染PDF页面...",
+        "优化文件大小..."
+    ]
+    TICK_INTERVAL = 0.1  # 刷新间隔（秒）
+    SIMULATE_TICKS = 3  # 进度条模式下每隔几次刷新模拟一次进度增长
     
-    def stop(self):
-        self.running = False
-        if self.spinner_thread:
-            self.spinner_thread.join()
-
-# 百分比进度条类
-class ProgressBar:
-    def __init__(self, total=100, width=40):
+    def __init__(self, total=None, width=40):
+        """
+        total为None时显示转圈动画，否则显示百分比进度条
+        """
         self.total = total
         self.width = width
         self.current = 0
-        self.running = False
-        self.progress_thread = None
-    
-    def update(self, value, message=""):
-        self.current = value
-        self.print_progress(message)
+        self.message = ""
+        self._stop_event = threading.Event()
+        # 所有终端输出都经过这把锁，避免刷新线程和主线程的输出交错
+        self._lock = threading.Lock()
+        self._thread = None
+        self._tick = 0
+        self._stage_idx = 0
     
-    def print_progress(self, message=""):
-        # 计算进度百分比
-        percent = min(int((self.current / self.total) * 100), 100)
-        # 计算进度条长度
-        filled_length = int(self.width * self.current / self.total)
-        # 构建进度条
-        bar = '█' * filled_length + '-' * (self.width - filled_length)
-        # 输出进度条
-        sys.stdout.write(f"\r{Colors.OKCYAN}[{Colors.OKGREEN}{bar}{Colors.OKCYAN}] {percent}% {message}{Colors.ENDC}")
+    def _render(self):
+        """渲染当前状态，整行一次写出并刷新一次"""
+        if self.total is None:
+            symbol = self.SPINNER_SYMBOLS[self._tick % len(self.SPINNER_SYMBOLS)]
+            line = f"\r{Colors.OKBLUE}{symbol} {self.message}{Colors.ENDC}"
+        else:
+            # 计算进度百分比和进度条长度
+            percent = min(int((self.current / self.total) * 100), 100)
+            filled_length = min(int(self.width * self.current / self.total), self.width)
+            bar = '█' * filled_length + '-' * (self.width - filled_length)
+            line = f"\r{Colors.OKCYAN}[{Colors.OKGREEN}{bar}{Colors.OKCYAN}] {percent}% {self.message}{Colors.ENDC}"
+        # 清除上一帧残留的较长文字
+        sys.stdout.write(line + "\033[K")
         sys.stdout.flush()
     
+    def _simulate_progress(self):
+        """进度条模式下模拟进度增加，返回是否需要重绘"""
+        if self._tick % self.SIMULATE_TICKS or self.current >= self.total:
+            return False
+        increment = min(5 + int(self.current / 20), 10)
+        self.current = min(self.current + increment, self.total)
+        # 每15%切换一次消息
+        if self.current // 15 > self._stage_idx and self._stage_idx < len(self.STAGES):
+            self._stage_idx += 1
+        if self._stage_idx > 0:
+            self.message = self.STAGES[self._stage_idx - 1]
+        return True
+    
+    def _run(self):
+        while True:
+            with self._lock:
+                # 转圈动画每次都重绘，进度条只在进度变化时重绘
+                if self.total is None or self._simulate_progress():
+                    self._render()
+                self._tick += 1
+            # Event.wait可被stop()立即打断，不必等满一个刷新间隔
+            if self._stop_event.wait(self.TICK_INTERVAL):
+                break
+    
     def start(self, message=""):
-        self.running = True
-        self.progress_thread = threading.Thread(target=self._animate, args=(message,))
-        self.progress_thread.daemon = True
-        self.progress_thread.start()
+        self.message = message
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
     
-    def _animate(self, message=""):
-        # 简单的动画，模拟进度更新
-        stages = [
-            "解析笔记本结构...",
-            "处理单元格内容...",
-            "转换为HTML格式...",
-            "应用样式和主题...",
-            "渲染PDF页面...",
-            "优化文件大小..."
-        ]
-        
-        stage_idx = 0
-        while self.running and self.current < self.total:
-            # 模拟进度增加
-            increment = min(5 + int(self.current / 20), 10)
-            self.current = min(self.current + increment, self.total)
-            
-            # 每15%切换一次消息
-            if self.current // 15 > stage_idx and stage_idx < len(stages):
-                stage_idx += 1
-            
-            current_message = stages[stage_idx - 1] if stage_idx > 0 else message
-            self.print_progress(current_message)
-            time.sleep(0.3)  # 调整更新频率
+    def update(self, value, message=""):
+        with self._lock:
+            self.current = value
+            self.message = message
+            self._render()
+    
+    def print_line(self, text):
+        """在指示器上方输出一行文字，下次刷新时重新绘制指示器"""
+        with self._lock:
+            sys.stdout.write(f"\r\033[K{text}\n")
+            if self.total is not None:
+                self._render()
+            sys.stdout.flush()
     
     def stop(self):
-        self.running = False
-        if self.progress_thread:
-            self.progress_thread.join()
-        # 确保显示100%
-        self.update(self.total, "转换完成！")
-        print()
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+        with self._lock:
+            if self.total is None:
+                # 清除转圈动画所在的行
+                sys.stdout.write("\r\033[K")
+                sys.stdout.flush()
+            else:
+                # 确保显示100%
+                self.current = self.total
+                self.message = "转换完成！"
+                self._render()
+                sys.stdout.write("\n")
+                sys.stdout.flush()
 
 # 清屏函数
 def clear_screen():
@@ -209,7 +225,7 @@ def get_output_file(input_file):
     output_dir = os.path.dirname(output_path)
     if output_dir and not os.path.exists(output_dir):
         try:
-            spinner = Spinner()
+            spinner = StatusIndicator()
             spinner.start(f"创建输出目录: {output_dir}")
             time.sleep(0.5)  # 给用户一些视觉反馈
             os.makedirs(output_dir)
@@ -271,28 +287,33 @@ def print_progress(stage, message):
     color = stages.get(stage, Colors.ENDC)
     print(f"{color}{message}{Colors.ENDC}")
 
+# 转换阶段对应的进度百分比、图标和颜色
+CONVERSION_STAGES = {
+    'html': (30, '🔧', Colors.OKBLUE),
+    'pdf': (60, '📊', Colors.OKBLUE),
+    'done': (90, '✅', Colors.OKGREEN),
+    'cleanup': (95, '🧹', Colors.OKGREEN),
+}
+
+# 在后台启动常驻浏览器
+def start_browser_worker():
+    """导入转换模块并启动常驻浏览器（在后台线程中调用）"""
+    from ipynb_to_pdf_converter import BrowserWorker
+    return BrowserWorker()
+
+# 获取预先启动的常驻浏览器
+def get_browser_worker(worker_future):
+    """等待后台启动完成并返回常驻浏览器，启动失败时返回None"""
+    if worker_future is None:
+        return None
+    try:
+        return worker_future.result()
+    except Exception:
+        return None
+
 # 运行转换程序
-def run_conversion(input_file, output_file, paper_size, orientation):
-    """运行转换程序"""
-    # 获取当前脚本所在目录
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    converter_path = os.path.join(script_dir, 'ipynb_to_pdf_converter.py')
-    
-    # 确保转换程序存在
-    if not os.path.exists(converter_path):
-        print(f"{Colors.FAIL}✗ 错误：找不到转换程序 '{converter_path}'{Colors.ENDC}")
-        return False
-    
-    # 构建命令参数
-    cmd = [
-        sys.executable,
-        converter_path,
-        input_file,
-        '--output', output_file,
-        '--paper', paper_size,
-        '--orientation', orientation
-    ]
-    
+def run_conversion(input_file, output_file, paper_size, orientation, browser_worker=None):
+    """在当前进程中运行转换程序，传入browser_worker时复用其中的常驻浏览器"""
     print_separator()
     print(f"{Colors.BOLD}{Colors.OKCYAN}开始转换过程{Colors.ENDC}")
     print_separator(char='-')
@@ -303,63 +324,47 @@ def run_conversion(input_file, output_file, paper_size, orientation):
     print_separator(char='-')
     
     # 创建并启动加载动画
-    spinner = Spinner()
+    spinner = StatusIndicator()
     spinner.start("正在准备转换环境...")
     
     try:
-        # 短暂延迟以显示动画
-        time.sleep(1)
+        # 转换模块会导入nbconvert和playwright，耗时较长，到真正开始转换时才导入
+        from ipynb_to_pdf_converter import IPYNBtoPDFConverter
+        converter = IPYNBtoPDFConverter(input_file, output_file, paper_size, orientation)
         spinner.stop()
         
         print_progress('start', "🚀 开始转换，这可能需要几分钟时间...")
         
-        # 运行转换命令
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            universal_newlines=True,
-            encoding='utf-8'
-        )
-        
         # 创建百分比进度条
-        progress_bar = ProgressBar()
+        progress_bar = StatusIndicator(total=100)
         progress_bar.start()
         
-        # 实时显示输出
-        last_stage = ""
-        for line in process.stdout:
-            line = line.strip()
-            if line:
-                # 根据输出内容更新进度条
-                if "临时HTML文件" in line:
-                    progress_bar.update(30)  # 30% 进度
-                    print(f"{Colors.OKBLUE}🔧 {line}{Colors.ENDC}")
-                elif "生成PDF" in line:
-                    progress_bar.update(60)  # 60% 进度
-                    print(f"{Colors.OKBLUE}📊 {line}{Colors.ENDC}")
-                elif "已生成" in line:
-                    progress_bar.update(90)  # 90% 进度
-                    print(f"{Colors.OKGREEN}✅ {line}{Colors.ENDC}")
-                elif "已清理" in line:
-                    progress_bar.update(95)  # 95% 进度
-                    print(f"{Colors.OKGREEN}🧹 {line}{Colors.ENDC}")
-                else:
-                    print(line)
+        def on_progress(stage, message):
+            # 根据转换阶段更新进度条并显示信息
+            if stage in CONVERSION_STAGES:
+                percent, icon, color = CONVERSION_STAGES[stage]
+                progress_bar.update(percent)
+                progress_bar.print_line(f"{color}{icon} {message}{Colors.ENDC}")
+            else:
+                progress_bar.print_line(message)
+        
+        if browser_worker is not None:
+            success = browser_worker.convert(converter, progress_cb=on_progress)
+        else:
+            success = converter.convert(progress_cb=on_progress)
         
         # 完成进度条
         progress_bar.stop()
-        process.wait()
         
         print_separator(char='-')
-        if process.returncode == 0:
+        if success:
             print_progress('success', "🎉 转换成功完成！")
             if os.path.exists(output_file):
                 file_size = os.path.getsize(output_file) / (1024 * 1024)
                 print(f"{Colors.OKGREEN}📁 PDF 文件大小: {file_size:.2f} MB{Colors.ENDC}")
             return True
         else:
-            print_progress('error', f"❌ 转换失败，返回码: {process.returncode}")
+            print_progress('error', "❌ 转换失败，请查看上方的错误信息")
             return False
             
     except Exception as e:
@@ -370,26 +375,61 @@ def run_conversion(input_file, output_file, paper_size, orientation):
         print_progress('error', f"❌ 转换过程中发生错误: {str(e)}")
         return False
 
+# 确认框内部宽度（按终端显示宽度计算）
+BOX_WIDTH = 58
+
+# 计算终端显示宽度
+def display_width(text):
+    """计算字符串在终端中的显示宽度，中文等全角字符占两列"""
+    return sum(2 if unicodedata.east_asian_width(ch) in ('W', 'F') else 1 for ch in text)
+
+# 按显示宽度截断字符串
+def truncate_display(text, width):
+    """按显示宽度截断字符串，超出时以...结尾"""
+    if display_width(text) <= width:
+        return text
+    result = ''
+    used = 0
+    for ch in text:
+        ch_width = display_width(ch)
+        if used + ch_width > width - 3:
+            break
+        result += ch
+        used += ch_width
+    return result + '...'
+
 # 显示参数确认框
 def show_confirmation(input_file, output_file, paper_size, orientation):
     """显示美化的参数确认框"""
-    print()
-    print(f"{Colors.BOLD}{Colors.OKCYAN}╔{'═' * 58}╗{Colors.ENDC}")
-    print(f"{Colors.BOLD}{Colors.OKCYAN}║{'转换参数确认':^58}║{Colors.ENDC}")
-    print(f"{Colors.BOLD}{Colors.OKCYAN}╠{'═' * 58}╣{Colors.ENDC}")
+    title = '转换参数确认'
+    title_left = (BOX_WIDTH - display_width(title)) // 2
+    title_right = BOX_WIDTH - display_width(title) - title_left
+    
+    lines = [
+        "",
+        f"{Colors.BOLD}{Colors.OKCYAN}╔{'═' * BOX_WIDTH}╗{Colors.ENDC}",
+        f"{Colors.BOLD}{Colors.OKCYAN}║{' ' * title_left}{title}{' ' * title_right}║{Colors.ENDC}",
+        f"{Colors.BOLD}{Colors.OKCYAN}╠{'═' * BOX_WIDTH}╣{Colors.ENDC}",
+    ]
+    
+    # 每行格式为 "║ 标签 值<补齐空格> ║"，按显示宽度补齐使右边框对齐
+    rows = [
+        ("输入文件:", input_file),
+        ("输出文件:", output_file),
+        ("纸张大小:", paper_size),
+        ("页面方向:", orientation),
+    ]
+    for label, value in rows:
+        value_width = BOX_WIDTH - display_width(label) - 3
+        value = truncate_display(value, value_width)
+        padding = ' ' * (value_width - display_width(value))
+        lines.append(f"{Colors.OKCYAN}║ {label} {Colors.ENDC}{value}{Colors.OKCYAN}{padding} ║{Colors.ENDC}")
     
-    # 格式化输出，使各部分对齐
-    max_label_len = 8
-    input_label = f"输入文件:".ljust(max_label_len)
-    output_label = f"输出文件:".ljust(max_label_len)
-    paper_label = f"纸张大小:".ljust(max_label_len)
-    orientation_label = f"页面方向:".ljust(max_label_len)
+    lines.append(f"{Colors.BOLD}{Colors.OKCYAN}╚{'═' * BOX_WIDTH}╝{Colors.ENDC}")
     
-    print(f"{Colors.OKCYAN}║ {input_label} {Colors.ENDC}{input_file[:48]}{'...' if len(input_file) > 48 else ''}{Colors.OKCYAN} {' ' * (58 - max_label_len - len(input_file[:48]) - (3 if len(input_file) > 48 else 0))} ║{Colors.ENDC}")
-    print(f"{Colors.OKCYAN}║ {output_label} {Colors.ENDC}{output_file[:48]}{'...' if len(output_file) > 48 else ''}{Colors.OKCYAN} {' ' * (58 - max_label_len - len(output_file[:48]) - (3 if len(output_file) > 48 else 0))} ║{Colors.ENDC}")
-    print(f"{Colors.OKCYAN}║ {paper_label} {Colors.ENDC}{paper_size}{Colors.OKCYAN} {' ' * (58 - max_label_len - len(paper_size))} ║{Colors.ENDC}")
-    print(f"{Colors.OKCYAN}║ {orientation_label} {Colors.ENDC}{orientation}{Colors.OKCYAN} {' ' * (58 - max_label_len - len(orientation))} ║{Colors.ENDC}")
-    print(f"{Colors.BOLD}{Colors.OKCYAN}╚{'═' * 58}╝{Colors.ENDC}")
+    # 整个确认框一次性输出
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.stdout.flush()
     
     # 确认提示 - 添加默认值为y
     prompt = f"{Colors.BOLD}{Colors.WARNING}🔍 确认开始转换? (y/n) [默认: y]: {Colors.ENDC}"
@@ -402,59 +442,61 @@ def show_confirmation(input_file, output_file, paper_size, orientation):
 # 主函数
 def main():
     """主函数"""
+    worker_future = None
     try:
         print_header()
         
-        # 检查依赖
-        spinner = Spinner()
-        spinner.start("检查必要的 Python 依赖...")
-        
-        try:
-            import nbconvert
-            import playwright
-            spinner.stop()
+        # 检查依赖：只查找模块而不导入，避免在启动时加载nbconvert和playwright
+        if all(importlib.util.find_spec(name) for name in ('nbconvert', 'playwright')):
             print(f"{Colors.OKGREEN}✅ 已安装必要的 Python 依赖{Colors.ENDC}")
-        except ImportError:
-            spinner.stop()
+            
+            # 在用户输入转换参数期间，于后台导入转换模块并预先启动浏览器
+            warmup_executor = ThreadPoolExecutor(max_workers=1)
+            worker_future = warmup_executor.submit(start_browser_worker)
+            warmup_executor.shutdown(wait=False)
+        else:
             print(f"{Colors.WARNING}⚠️  警告：未检测到所有必要的依赖。{Colors.ENDC}")
             print(f"{Colors.ITALIC}  建议运行: pip install nbconvert playwright pandas jupyter matplotlib seaborn{Colors.ENDC}")
             print(f"{Colors.ITALIC}  以及: playwright install chromium{Colors.ENDC}")
             input(f"{Colors.OKCYAN}  按回车键继续...{Colors.ENDC}")
         
-        print_separator()
-        
-        # 获取用户输入
-        input_file = get_input_file()
-        output_file = get_output_file(input_file)
-        paper_size = get_paper_size()
-        orientation = get_orientation()
-        
-        # 确认参数
-        if not show_confirmation(input_file, output_file, paper_size, orientation):
-            print(f"{Colors.WARNING}🛑 转换已取消。{Colors.ENDC}")
-            return
-        
-        # 执行转换
-        success = run_conversion(input_file, output_file, paper_size, orientation)
-        
-        # 转换完成后的提示
-        print_separator()
-        if success:
-            print(f"{Colors.BG_GREEN} {Colors.BOLD}✓ 转换完成！PDF 文件已保存至: {output_file} {Colors.ENDC}")
-        else:
-            print(f"{Colors.BG_RED} {Colors.BOLD}✗ 转换失败，请检查错误信息并尝试解决问题。 {Colors.ENDC}")
+        while True:
+            print_separator()
+            
+            # 获取用户输入
+            input_file = get_input_file()
+            output_file = get_output_file(input_file)
+            paper_size = get_paper_size()
+            orientation = get_orientation()
+            
+            # 确认参数
+            if not show_confirmation(input_file, output_file, paper_size, orientation):
+                print(f"{Colors.WARNING}🛑 转换已取消。{Colors.ENDC}")
+                return
+            
+            # 执行转换，多次转换共用同一个浏览器
+            success = run_conversion(input_file, output_file, paper_size, orientation,
+                                     get_browser_worker(worker_future))
+            
+            # 转换完成后的提示
+            print_separator()
+            if success:
+                print(f"{Colors.BG_GREEN} {Colors.BOLD}✓ 转换完成！PDF 文件已保存至: {output_file} {Colors.ENDC}")
+            else:
+                print(f"{Colors.BG_RED} {Colors.BOLD}✗ 转换失败，请检查错误信息并尝试解决问题。 {Colors.ENDC}")
+            
+            # 询问是否继续转换其他文件
+            print()
+            prompt = f"{Colors.BOLD}{Colors.OKCYAN}🔄 是否继续转换其他文件? (y/n) [默认: n]: {Colors.ENDC}"
+            again = input(prompt).strip().lower()
+            if again != 'y':
+                break
+            print_header()
         
-        # 询问是否继续转换其他文件
         print()
-        prompt = f"{Colors.BOLD}{Colors.OKCYAN}🔄 是否继续转换其他文件? (y/n) [默认: n]: {Colors.ENDC}"
-        again = input(prompt).strip().lower()
-        if again == 'y':
-            main()
-        else:
-            print()
-            print(f"{Colors.BOLD}{Colors.HEADER}感谢使用 Jupyter Notebook 到 PDF 转换工具！{Colors.ENDC}")
-            print(f"{Colors.ITALIC}祝您工作顺利！{Colors.ENDC}")
-            print_separator()
+        print(f"{Colors.BOLD}{Colors.HEADER}感谢使用 Jupyter Notebook 到 PDF 转换工具！{Colors.ENDC}")
+        print(f"{Colors.ITALIC}祝您工作顺利！{Colors.ENDC}")
+        print_separator()
             
     except KeyboardInterrupt:
         print(f"\n{Colors.WARNING}👋 程序已被用户中断。{Colors.ENDC}")
@@ -463,6 +505,10 @@ def main():
         import traceback
         traceback.print_exc()
     finally:
+        # 关闭常驻浏览器
+        browser_worker = get_browser_worker(worker_future)
+        if browser_worker is not None:
+            browser_worker.close()
         input(f"\n{Colors.OKCYAN}👋 按回车键退出程序...{Colors.ENDC}")
 
 if __name__ == "__main__":
@@ -7,18 +7,442 @@ Jupyter Notebook 到 PDF 转换工具
 """
 
 import os
+import re
 import sys
+import glob
 import json
-import base64
+import asyncio
+import hashlib
 from pathlib import Path
 import argparse
 import tempfile
 import shutil
-from concurrent.futures import ThreadPoolExecutor
+import queue
+import threading
+import contextlib
+from concurrent.futures import Future, ThreadPoolExecutor
 
 import nbformat
+import nbconvert
 from nbconvert import HTMLExporter
 from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
+
+# orjson为可选依赖，可直接解析bytes且速度更快；未安装时退回标准库json
+try:
+    import orjson
+
+    def _json_loads(data):
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson不接受nbformat允许写出的NaN/Infinity和超过64位的整数，交给标准库json解析
+            return json.loads(data)
+except ImportError:
+    _json_loads = json.loads
+
+# 转换结果缓存：以notebook内容和页面参数为键保存生成的PDF
+# 修改CSS或渲染逻辑时需要递增CACHE_VERSION，使旧的缓存失效
+CACHE_DIR = Path(tempfile.gettempdir()) / "ipynb2pdf_cache"
+CACHE_VERSION = "v1"
+CACHE_MAX_ENTRIES = 3  # 只保留最近使用的3个缓存条目
+
+# 页面渲染等待：MathJax脚本加载的最长等待时间，以及整体渲染的兜底超时（毫秒）
+MATHJAX_LOAD_TIMEOUT_MS = 10000
+RENDER_TIMEOUT_MS = 60000
+
+# 在页面中执行的等待脚本：依次等待MathJax完成公式排版、网页字体和图片加载完成
+WAIT_FOR_RENDER_JS = """
+    async ({ loadTimeout, renderTimeout }) => {
+        const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+        const ready = (async () => {
+            // 页面引用了MathJax时，等待其加载并完成排版（兼容MathJax 2和3）
+            if (document.querySelector('script[src*="mathjax" i]')) {
+                const deadline = Date.now() + loadTimeout;
+                const loaded = () => window.MathJax && (window.MathJax.Hub ||
+                    (window.MathJax.startup && window.MathJax.startup.promise));
+                while (!loaded() && Date.now() < deadline) {
+                    await sleep(20);
+                }
+                if (loaded()) {
+                    if (window.MathJax.startup) {
+                        await window.MathJax.startup.promise;
+                    } else {
+                        await new Promise(resolve => window.MathJax.Hub.Register.StartupHook('End', resolve));
+                    }
+                }
+            }
+            // 公式排版会引入新的字体，排版完成后再等待字体加载
+            await document.fonts.ready;
+            // 确保所有图片都已加载，即使图片加载失败也继续
+            await Promise.all(Array.from(document.images).map(img => img.complete ? null :
+                new Promise(resolve => {
+                    img.addEventListener('load', resolve);
+                    img.addEventListener('error', resolve);
+                })));
+        })();
+        // 兜底超时，避免外部资源异常时无限等待
+        await Promise.race([ready, sleep(renderTimeout)]);
+    }
+"""
+
+# 自定义CSS，以确保中文显示和A3纸张格式；渲染HTML时插入到<head>之后
+CUSTOM_CSS = """
+<style>
+    @font-face {
+        font-family: 'Computer Modern';
+        src: local('Computer Modern'), local('CMU Serif');
+    }
+    body {
+        font-family: 'Computer Modern', 'Times New Roman', serif;
+        font-size: 12pt;
+        line-height: 1.6;
+        margin: 0;
+        padding: 0;
+        color: #000000;
+        background-color: #ffffff;
+    }
+    .container {
+        max-width: 100%;
+        margin: 0;
+        padding: 2cm;
+        box-sizing: border-box;
+    }
+    /* 确保代码块显示正常 */
+    pre, code {
+        font-family: 'Courier New', Courier, monospace;
+        background-color: #f5f5f5;
+        border-radius: 3px;
+        padding: 0.2em 0.4em;
+    }
+    pre {
+        padding: 1em;
+        overflow-x: auto;
+    }
+    /* 确保公式显示正常 */
+    .MathJax {
+        font-size: 115% !important;
+    }
+    /* 调整标题样式 */
+    h1, h2, h3, h4, h5, h6 {
+        color: #000000;
+        margin-top: 1.5em;
+        margin-bottom: 0.5em;
+    }
+    /* 确保表格显示正常 */
+    table {
+        border-collapse: collapse;
+        width: 100%;
+        margin-bottom: 1em;
+    }
+    th, td {
+        border: 1px solid #ddd;
+        padding: 8px;
+        text-align: left;
+    }
+    th {
+        background-color: #f2f2f2;
+    }
+    /* 确保图片正确缩放 */
+    img {
+        max-width: 100%;
+        height: auto;
+        margin: 1em 0;
+    }
+    /* 修复某些组件的显示问题 */
+    .output {
+        margin-top: 1em;
+        padding: 1em;
+        border: 1px solid #eee;
+        border-radius: 4px;
+    }
+    /* 防止页面内容溢出 */
+    .output_area {
+        overflow-x: auto;
+    }
+</style>
+"""
+# 查找<head>标签时只搜索HTML开头的这些字符，避免扫描嵌入了大量图片数据的整个文档
+HEAD_SEARCH_LIMIT = 8192
+
+# 写入资源文件（如图片）时使用的最大线程数
+RESOURCE_WRITE_WORKERS = 8
+
+# 单元格HTML片段缓存目录
+CELL_CACHE_DIR = Path.home() / ".cache" / "ipynb2pdf" / "cells"
+CELL_CACHE_MAX_BYTES = 256 * 1024 * 1024  # 片段缓存总大小上限，超出时删除最久未使用的片段
+
+class CellCachedHTMLExporter(HTMLExporter):
+    """
+    按单元格缓存HTML片段的导出器
+    
+    每个单元格以其内容（源码、输出、元数据）的哈希值为键缓存渲染结果，
+    未改动的单元格直接复用缓存片段，只有新增或修改过的单元格才交给模板渲染
+    """
+    
+    # 单元格id是否计入缓存键。nbformat 4.5之前的notebook没有id，升级时每次都会随机生成，
+    # 计入缓存键会导致永远无法命中，此时应设为False
+    hash_cell_ids = True
+    
+    def _render_context(self, nb):
+        """
+        计算影响单元格渲染结果的上下文（导出器版本、模板、导出选项和内核语言）
+        """
+        context = {
+            'nbconvert': nbconvert.__version__,
+            'template': [self.template_name, self.template_file],
+            'exclude': [self.exclude_input_prompt, self.exclude_output_prompt,
+                        self.exclude_input, self.exclude_output, self.embed_images],
+            'language_info': nb.metadata.get('language_info', {}),
+            'kernelspec': nb.metadata.get('kernelspec', {}),
+        }
+        return json.dumps(context, sort_keys=True).encode()
+    
+    def from_notebook_node(self, nb, resources=None, **kw):
+        """
+        导出notebook，命中缓存的单元格不参与模板渲染
+        
+        渲染时在每个单元格前插入一个原样输出的标记单元格，命中缓存的单元格只保留标记，
+        渲染完成后按标记切分结果，将缓存片段填回对应位置，并把新渲染的片段写入缓存
+        """
+        context = self._render_context(nb)
+        marker = f"ipynb2pdf-cell-{os.urandom(8).hex()}"
+        
+        cell_hashes = []
+        cached_fragments = {}
+        render_cells = []
+        for idx, cell in enumerate(nb.cells):
+            key_cell = cell if self.hash_cell_ids else {k: v for k, v in cell.items() if k != 'id'}
+            cell_hash = hashlib.blake2b(json.dumps(key_cell, sort_keys=True).encode() + context).hexdigest()
+            cell_hashes.append(cell_hash)
+            render_cells.append(nbformat.v4.new_raw_cell(f"{marker}-{idx}"))
+            
+            cache_file = CELL_CACHE_DIR / f"{cell_hash}.html"
+            try:
+                cached_fragments[idx] = cache_file.read_text(encoding='utf-8')
+            except OSError:
+                render_cells.append(cell)
+            else:
+                # 刷新使用时间，供LRU清理判断；片段刚被并发清理删除也不影响本次使用
+                with contextlib.suppress(OSError):
+                    os.utime(cache_file)
+        render_cells.append(nbformat.v4.new_raw_cell(f"{marker}-{len(nb.cells)}"))
+        
+        # 全部命中时仍需渲染一次页面框架（头部、样式等），此时只包含标记单元格，开销很小
+        render_nb = nbformat.NotebookNode(nb)
+        render_nb['cells'] = render_cells
+        body, output_resources = super().from_notebook_node(render_nb, resources, **kw)
+        
+        parts = re.split(rf"{marker}-\d+", body)
+        if len(parts) != len(nb.cells) + 2:
+            # 模板没有原样输出标记单元格，无法拼接，退回完整渲染
+            return super().from_notebook_node(nb, resources, **kw)
+        
+        CELL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        fragments = parts[1:-1]
+        for idx, cell_hash in enumerate(cell_hashes):
+            if idx in cached_fragments:
+                fragments[idx] = cached_fragments[idx]
+                continue
+            # 先写临时文件再重命名，避免并发转换读到不完整的片段
+            cache_file = CELL_CACHE_DIR / f"{cell_hash}.html"
+            tmp_file = cache_file.with_suffix(f".{os.getpid()}-{threading.get_ident()}.tmp")
+            try:
+                tmp_file.write_text(fragments[idx], encoding='utf-8')
+                os.replace(tmp_file, cache_file)
+            except OSError:
+                pass
+        
+        # 只有写入了新片段时缓存才会变大，这时才检查是否需要清理
+        if len(cached_fragments) < len(cell_hashes):
+            self._prune_cache()
+        
+        body = parts[0] + ''.join(fragments) + parts[-1]
+        return body, output_resources
+    
+    @staticmethod
+    def _prune_cache():
+        """
+        片段缓存超过CELL_CACHE_MAX_BYTES时，按最近使用时间删除最旧的片段
+        """
+        entries = []
+        total_size = 0
+        try:
+            with os.scandir(CELL_CACHE_DIR) as it:
+                for entry in it:
+                    if not entry.name.endswith('.html'):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        # 并发转换的清理可能刚删除了该片段
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total_size += stat.st_size
+        except OSError:
+            return
+        
+        if total_size <= CELL_CACHE_MAX_BYTES:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total_size -= size
+            if total_size <= CELL_CACHE_MAX_BYTES:
+                break
+
+def fast_copy(src, dst):
+    """
+    复制文件内容
+    
+    Linux下优先使用os.copy_file_range，数据在内核中直接复制，不经过用户态缓冲区，
+    在支持的文件系统上还可以直接共享数据块；其他平台或调用失败时退回shutil.copyfile
+    
+    Args:
+        src: 源文件路径
+        dst: 目标文件路径
+    """
+    if hasattr(os, 'copy_file_range'):
+        try:
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                remaining = os.fstat(fsrc.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+            if remaining == 0:
+                return
+        except OSError:
+            # 例如旧内核不支持跨文件系统复制（EXDEV），交给下面的通用实现
+            pass
+    shutil.copyfile(src, dst)
+
+def write_bytes(path, data):
+    """
+    将字节数据写入文件
+    
+    直接使用os.open/os.write，省去Python文件对象的缓冲和上下文管理开销；
+    os.write可能只写入一部分，因此循环写到全部完成
+    
+    Args:
+        path: 文件路径
+        data: 要写入的字节数据
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+def _block_external_assets(route):
+    """
+    拦截非本地的字体和媒体请求，其余请求正常放行
+    
+    MathJax的字体不拦截，公式渲染依赖这些字体
+    
+    同步API和异步API共用此函数：异步API下abort()/continue_()返回的协程需要交回Playwright等待
+    
+    Args:
+        route: Playwright的路由对象
+    """
+    request = route.request
+    if (request.resource_type in ('font', 'media')
+            and not request.url.startswith('file://')
+            and 'mathjax' not in request.url.lower()):
+        return route.abort()
+    return route.continue_()
+
+def launch_browser(playwright):
+    """
+    启动用于生成PDF的无头Chromium浏览器
+    
+    Args:
+        playwright: sync_playwright()或async_playwright()启动后的Playwright实例
+    
+    Returns:
+        浏览器实例，可在多次转换之间复用（异步API下返回需要await的协程）
+    """
+    return playwright.chromium.launch(
+        headless=True,
+        args=[
+            '--disable-gpu',
+            '--disable-dev-shm-usage',
+            '--disable-setuid-sandbox',
+            '--no-sandbox'
+        ]
+    )
+
+class BrowserWorker:
+    """
+    在专用线程中持有一个常驻浏览器，并在该线程中执行转换任务
+    
+    Playwright同步API的对象只能在创建它的线程中使用，因此浏览器的启动、使用和关闭
+    都放在同一个工作线程中。创建实例后浏览器立即在后台启动，调用方可以同时做其他事情
+    """
+    
+    def __init__(self):
+        self._tasks = queue.Queue()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+    
+    def _run(self):
+        stack = contextlib.ExitStack()
+        try:
+            p = stack.enter_context(sync_playwright())
+            browser = launch_browser(p)
+            stack.callback(browser.close)
+        except Exception:
+            # 预启动失败时不共享浏览器，由每次转换自行启动并报告具体错误
+            stack.close()
+            browser = None
+        
+        with stack:
+            while True:
+                task = self._tasks.get()
+                if task is None:
+                    break
+                future, converter, kwargs = task
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(converter.convert(browser=browser, **kwargs))
+                except BaseException as e:
+                    future.set_exception(e)
+    
+    def submit(self, converter, **kwargs):
+        """
+        提交转换任务
+        
+        Args:
+            converter: IPYNBtoPDFConverter实例
+            **kwargs: 传给converter.convert()的其他参数
+        
+        Returns:
+            Future对象，结果为convert()的返回值
+        """
+        future = Future()
+        self._tasks.put((future, converter, kwargs))
+        return future
+    
+    def convert(self, converter, **kwargs):
+        """
+        使用常驻浏览器执行转换并等待完成
+        """
+        return self.submit(converter, **kwargs).result()
+    
+    def close(self):
+        """
+        处理完已提交的任务后关闭浏览器
+        """
+        self._tasks.put(None)
+        self._thread.join()
 
 class IPYNBtoPDFConverter:
     """Jupyter Notebook 到 PDF 转换类"""
@@ -49,71 +473,42 @@ class IPYNBtoPDFConverter:
         self.paper_size = paper_size
         self.orientation = orientation
         self.temp_dir = None
-    
-    def extract_embedded_images(self, notebook_content):
-        """
-        提取notebook中嵌入的base64编码图片并保存到临时目录
+        # LRU清理时保留的缓存条目数，批量转换时调大，避免同一批文件互相挤掉缓存
+        self.cache_max_entries = CACHE_MAX_ENTRIES
         
-        Args:
-            notebook_content: 解析后的notebook内容
-        
-        Returns:
-            处理后的notebook内容（更新图片引用）
-        """
-        if not self.temp_dir:
-            self.temp_dir = tempfile.mkdtemp()
-        
-        image_dir = Path(self.temp_dir) / "images"
-        image_dir.mkdir(exist_ok=True)
-        
-        # 遍历所有单元格
-        for cell in notebook_content.cells:
-            if cell.cell_type == 'markdown' or cell.cell_type == 'code':
-                if 'outputs' in cell:
-                    for output in cell.outputs:
-                        if 'data' in output:
-                            data = output['data']
-                            # 处理base64编码的图片
-                            for mime_type in ['image/png', 'image/jpeg', 'image/jpg']:
-                                if mime_type in data:
-                                    image_data = data[mime_type]
-                                    if isinstance(image_data, str):
-                                        # 创建唯一的图片文件名
-                                        import hashlib
-                                        img_hash = hashlib.md5(image_data.encode()).hexdigest()
-                                        img_ext = mime_type.split('/')[1]
-                                        img_filename = f"embedded_{img_hash}.{img_ext}"
-                                        img_path = image_dir / img_filename
-                                        
-                                        # 保存图片
-                                        with open(img_path, 'wb') as f:
-                                            f.write(base64.b64decode(image_data))
-                                        
-                                        # 更新output数据，将base64数据替换为文件引用
-                                        # 注意：这不会修改原始的JSON结构，因为我们只在转换为HTML时处理
-        
-        return notebook_content
+        # 根据notebook内容、纸张大小、方向和缓存版本计算缓存路径；
+        # 读取的内容保留下来供render_html使用，不再重复读取文件，也保证渲染的内容与缓存键一致
+        with open(self.input_file, 'rb') as f:
+            self.notebook_bytes = f.read()
+        cache_key = hashlib.blake2b(
+            self.notebook_bytes + f"{paper_size}|{orientation}|{CACHE_VERSION}".encode()
+        ).hexdigest()
+        self.cache_path = CACHE_DIR / f"{cache_key}.pdf"
     
-    def convert_to_html(self):
+    def render_html(self):
         """
-        将ipynb转换为HTML文件
+        将ipynb渲染为HTML，只在内存中生成，不写入磁盘
         
         Returns:
-            HTML文件路径
+            (HTML字符串, nbconvert的资源字典)
         """
-        if not self.temp_dir:
-            self.temp_dir = tempfile.mkdtemp()
-        
-        # 读取notebook文件
-        with open(self.input_file, 'r', encoding='utf-8') as f:
-            notebook = nbformat.read(f, as_version=4)
-        
-        # 提取嵌入图片
-        notebook = self.extract_embedded_images(notebook)
+        # 解析初始化时读取的原始字节，避免先把整个文件解码成字符串
+        nb_dict = _json_loads(self.notebook_bytes)
+        # 与nbformat.read相同：按文件版本还原（合并分行保存的source等），再统一转换为v4
+        major, minor = nbformat.reader.get_version(nb_dict)
+        notebook = nbformat.versions[major].to_notebook_json(nb_dict, minor=minor)
+        notebook = nbformat.convert(notebook, 4)
+        try:
+            nbformat.validate(notebook)
+        except nbformat.ValidationError as e:
+            # 与nbformat.read一致：格式校验失败只提示，不中断转换
+            print(f"Notebook格式校验失败: {str(e)}")
         
-        # 创建HTML导出器
-        html_exporter = HTMLExporter()
+        # 创建HTML导出器（按单元格缓存渲染结果）
+        html_exporter = CellCachedHTMLExporter()
         html_exporter.template_name = 'classic'
+        # 4.5之前的notebook在上面的升级中才生成单元格id，每次都不同，不计入缓存键
+        html_exporter.hash_cell_ids = (major, minor) >= (4, 5)
         
         # 配置HTML导出选项
         html_exporter.exclude_input_prompts = False
@@ -124,227 +519,443 @@ class IPYNBtoPDFConverter:
         # 导出HTML
         (body, resources) = html_exporter.from_notebook_node(notebook)
         
-        # 添加自定义CSS以确保中文显示和A3纸张格式
-        custom_css = """
-        <style>
-            @font-face {
-                font-family: 'Computer Modern';
-                src: local('Computer Modern'), local('CMU Serif');
-            }
-            body {
-                font-family: 'Computer Modern', 'Times New Roman', serif;
-                font-size: 12pt;
-                line-height: 1.6;
-                margin: 0;
-                padding: 0;
-                color: #000000;
-                background-color: #ffffff;
-            }
-            .container {
-                max-width: 100%;
-                margin: 0;
-                padding: 2cm;
-                box-sizing: border-box;
-            }
-            /* 确保代码块显示正常 */
-            pre, code {
-                font-family: 'Courier New', Courier, monospace;
-                background-color: #f5f5f5;
-                border-radius: 3px;
-                padding: 0.2em 0.4em;
-            }
-            pre {
-                padding: 1em;
-                overflow-x: auto;
-            }
-            /* 确保公式显示正常 */
-            .MathJax {
-                font-size: 115% !important;
-            }
-            /* 调整标题样式 */
-            h1, h2, h3, h4, h5, h6 {
-                color: #000000;
-                margin-top: 1.5em;
-                margin-bottom: 0.5em;
-            }
-            /* 确保表格显示正常 */
-            table {
-                border-collapse: collapse;
-                width: 100%;
-                margin-bottom: 1em;
-            }
-            th, td {
-                border: 1px solid #ddd;
-                padding: 8px;
-                text-align: left;
-            }
-            th {
-                background-color: #f2f2f2;
-            }
-            /* 确保图片正确缩放 */
-            img {
-                max-width: 100%;
-                height: auto;
-                margin: 1em 0;
-            }
-            /* 修复某些组件的显示问题 */
-            .output {
-                margin-top: 1em;
-                padding: 1em;
-                border: 1px solid #eee;
-                border-radius: 4px;
-            }
-            /* 防止页面内容溢出 */
-            .output_area {
-                overflow-x: auto;
-            }
-        </style>
-        """
-        
         # 将自定义CSS添加到HTML头部
-        if '<head>' in body:
-            body = body.replace('<head>', f'<head>{custom_css}')
+        idx = body.find('<head>', 0, HEAD_SEARCH_LIMIT)
+        if idx != -1:
+            idx += len('<head>')
+            body = body[:idx] + CUSTOM_CSS + body[idx:]
         else:
-            body = f"{custom_css}{body}"
+            body = CUSTOM_CSS + body
+        
+        return body, resources
+    
+    def write_html(self, body, resources):
+        """
+        将HTML及其引用的资源文件（如图片）写入临时目录
+        
+        Args:
+            body: render_html生成的HTML字符串
+            resources: render_html返回的资源字典
+        
+        Returns:
+            HTML文件路径
+        """
+        if not self.temp_dir:
+            self.temp_dir = tempfile.mkdtemp()
         
         # 保存HTML文件
         html_path = Path(self.temp_dir) / f"{self.input_file.stem}.html"
         with open(html_path, 'w', encoding='utf-8') as f:
             f.write(body)
         
-        # 复制资源文件（如嵌入的图片）
-        if 'outputs' in resources:
-            for key, value in resources['outputs'].items():
-                output_path = Path(self.temp_dir) / key
-                with open(output_path, 'wb') as f:
-                    f.write(value)
+        # 复制资源文件（如嵌入的图片）：先一次性创建所需目录，再用线程池并行写入
+        outputs = [(Path(self.temp_dir) / key, value)
+                   for key, value in resources.get('outputs', {}).items()]
+        for parent in {output_path.parent for output_path, _ in outputs}:
+            parent.mkdir(parents=True, exist_ok=True)
+        if len(outputs) > 1:
+            with ThreadPoolExecutor(max_workers=min(RESOURCE_WRITE_WORKERS, len(outputs))) as executor:
+                # list()取出结果，使写入失败的异常在这里抛出
+                list(executor.map(lambda item: write_bytes(*item), outputs))
+        else:
+            for output_path, value in outputs:
+                write_bytes(output_path, value)
         
         return html_path
     
-    def html_to_pdf(self, html_path):
+    def convert_to_html(self):
+        """
+        将ipynb转换为HTML文件
+        
+        Returns:
+            HTML文件路径
+        """
+        return self.write_html(*self.render_html())
+    
+    def _context_options(self):
+        """
+        浏览器上下文的参数
+        """
+        return {
+            'viewport': {'width': 1920, 'height': 1080},
+            # 设置支持中文的用户代理
+            'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+        }
+    
+    def _pdf_options(self):
+        """
+        page.pdf()的参数
+        """
+        return {
+            'path': str(self.output_file),
+            'format': self.paper_size.lower(),
+            'landscape': self.orientation.lower() == 'landscape',
+            'print_background': True,
+            'margin': {
+                'top': '2cm',
+                'right': '2cm',
+                'bottom': '2cm',
+                'left': '2cm'
+            },
+            # 确保字体嵌入以支持中文显示
+            'prefer_css_page_size': True
+        }
+    
+    def html_to_pdf(self, html_path, browser=None):
         """
         使用Playwright将HTML转换为PDF
         
         Args:
             html_path: HTML文件路径
+            browser: 已启动的浏览器实例（可选），传入时只新建页面，不再重复启动浏览器
         """
+        if browser is None:
+            # 未传入浏览器时，为本次转换单独启动一个
+            with sync_playwright() as p:
+                browser = launch_browser(p)
+                try:
+                    self.html_to_pdf(html_path, browser)
+                finally:
+                    # 关闭浏览器
+                    browser.close()
+            return
+        
         # 将路径转换为file:// URL
         html_url = f"file://{html_path.resolve()}"
         
-        # 使用Playwright将HTML转换为PDF
-        with sync_playwright() as p:
-            # 启动Chromium
-            browser = p.chromium.launch(
-                headless=True,
-                args=[
-                    '--disable-gpu',
-                    '--disable-dev-shm-usage',
-                    '--disable-setuid-sandbox',
-                    '--no-sandbox'
-                ]
-            )
-            
+        # 创建新的浏览器上下文
+        context = browser.new_context(**self._context_options())
+        # 拦截外部字体和媒体请求，避免网络不稳定时拖慢渲染
+        context.route("**/*", _block_external_assets)
+        
+        try:
             # 创建新页面
-            page = browser.new_page(
-                viewport={'width': 1920, 'height': 1080},
-                # 设置支持中文的用户代理
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            )
+            page = context.new_page()
             
-            # 导航到HTML文件
-            page.goto(html_url, wait_until='networkidle')
+            # 导航到HTML文件，DOM解析完成即可，其余资源由下面的事件等待
+            page.goto(html_url, wait_until='domcontentloaded')
             
-            # 等待所有内容加载完成，特别是数学公式
-            page.wait_for_timeout(2000)  # 等待2秒确保内容加载
+            # 等待公式排版、字体和图片加载完成，代替固定的等待时间
+            page.evaluate(WAIT_FOR_RENDER_JS, {
+                'loadTimeout': MATHJAX_LOAD_TIMEOUT_MS,
+                'renderTimeout': RENDER_TIMEOUT_MS
+            })
             
-            # 获取页面高度以确保捕获所有内容
-            page.evaluate("""
-                () => {
-                    // 确保所有图片都已加载
-                    const images = document.querySelectorAll('img');
-                    const promises = Array.from(images).map(img => {
-                        if (img.complete) return Promise.resolve();
-                        return new Promise(resolve => {
-                            img.onload = resolve;
-                            img.onerror = resolve; // 即使图片加载失败也继续
-                        });
-                    });
-                    return Promise.all(promises);
-                }
-            """)
+            # 生成PDF
+            page.pdf(**self._pdf_options())
+        finally:
+            # 只关闭上下文（及其页面），浏览器由调用方管理
+            context.close()
+    
+    async def html_to_pdf_async(self, browser, body, resources):
+        """
+        使用Playwright异步API将HTML转换为PDF
+        
+        没有需要引用的资源文件时直接用set_content载入HTML，不写临时文件；
+        否则先把HTML和资源写入临时目录（在线程池中进行，不阻塞事件循环），
+        再按file:// URL打开，使相对路径的图片能够加载
+        
+        Args:
+            browser: 异步API启动的浏览器实例
+            body: render_html生成的HTML字符串
+            resources: render_html返回的资源字典
+        """
+        context = await browser.new_context(**self._context_options())
+        # 拦截外部字体和媒体请求，避免网络不稳定时拖慢渲染
+        await context.route("**/*", _block_external_assets)
+        
+        try:
+            page = await context.new_page()
             
-            # 设置PDF选项
-            pdf_options = {
-                'path': str(self.output_file),
-                'format': self.paper_size.lower(),
-                'landscape': self.orientation.lower() == 'landscape',
-                'print_background': True,
-                'margin': {
-                    'top': '2cm',
-                    'right': '2cm',
-                    'bottom': '2cm',
-                    'left': '2cm'
-                },
-                # 确保字体嵌入以支持中文显示
-                'prefer_css_page_size': True
-            }
+            if resources.get('outputs'):
+                loop = asyncio.get_running_loop()
+                html_path = await loop.run_in_executor(None, self.write_html, body, resources)
+                await page.goto(f"file://{html_path.resolve()}", wait_until='domcontentloaded')
+            else:
+                await page.set_content(body, wait_until='domcontentloaded')
             
-            # 生成PDF
-            page.pdf(**pdf_options)
+            # 等待公式排版、字体和图片加载完成
+            await page.evaluate(WAIT_FOR_RENDER_JS, {
+                'loadTimeout': MATHJAX_LOAD_TIMEOUT_MS,
+                'renderTimeout': RENDER_TIMEOUT_MS
+            })
+            
+            await page.pdf(**self._pdf_options())
+        finally:
+            await context.close()
+    
+    def save_to_cache(self):
+        """
+        将生成的PDF保存到缓存目录，并按最近使用时间清理多余的缓存条目（保留cache_max_entries个）
+        """
+        try:
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            # 先写入临时文件再重命名，避免其他进程读到不完整的PDF
+            tmp_path = self.cache_path.with_suffix(f".{os.getpid()}-{threading.get_ident()}.tmp")
+            fast_copy(self.output_file, tmp_path)
+            os.replace(tmp_path, self.cache_path)
             
-            # 关闭浏览器
-            browser.close()
+            # LRU清理：只保留最近使用的cache_max_entries个条目
+            entries = []
+            for entry in CACHE_DIR.glob("*.pdf"):
+                try:
+                    entries.append((entry.stat().st_mtime, entry))
+                except FileNotFoundError:
+                    # 批量转换时其他线程的LRU清理可能刚删除了该条目
+                    continue
+            entries.sort(reverse=True)
+            for _, stale in entries[self.cache_max_entries:]:
+                stale.unlink(missing_ok=True)
+        except OSError as e:
+            print(f"写入转换缓存失败: {str(e)}")
     
-    def convert(self):
+    def convert(self, browser=None, progress_cb=None):
         """
         执行完整的转换流程
+        
+        Args:
+            browser: 已启动的浏览器实例（可选），批量转换时传入以复用同一个浏览器
+            progress_cb: 进度回调（可选），以 progress_cb(stage, message) 的形式调用，
+                stage 依次为 'start'、'html'、'pdf'、'done'、'cleanup'；
+                传入时进度信息交给回调处理，不再直接打印
+        """
+        report = self._reporter(progress_cb)
+        
+        try:
+            report('start', f"开始转换: {self.input_file}")
+            report('start', f"输出路径: {self.output_file}")
+            
+            # 0. 命中缓存时直接复制PDF，跳过HTML生成和浏览器启动
+            if self._serve_from_cache(report):
+                return True
+            
+            # 1. 在后台线程中转换为HTML，同时在当前线程启动浏览器，两者的耗时相互重叠
+            #    （Playwright同步API的对象只能在创建它的线程中使用，所以浏览器留在当前线程）
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                html_future = executor.submit(self.convert_to_html)
+                
+                with contextlib.ExitStack() as stack:
+                    if browser is None:
+                        p = stack.enter_context(sync_playwright())
+                        browser = launch_browser(p)
+                        stack.callback(browser.close)
+                    
+                    html_path = html_future.result()
+                    report('html', f"已生成临时HTML文件: {html_path}")
+                    
+                    # 2. HTML转换为PDF
+                    report('pdf', "正在使用Playwright生成PDF...")
+                    self.html_to_pdf(html_path, browser)
+                    report('done', f"PDF文件已生成: {self.output_file}")
+            
+            # 3. 保存到缓存，供下次转换相同内容时直接使用
+            self.save_to_cache()
+            
+            return True
+        
+        except Exception as e:
+            self._report_failure(e)
+            return False
+        
+        finally:
+            self._cleanup(report)
+    
+    async def convert_async(self, get_browser, progress_cb=None):
+        """
+        使用Playwright异步API执行完整的转换流程
+        
+        HTML渲染以及复制缓存、写入缓存、清理临时目录等文件操作都在线程池中进行，
+        不阻塞事件循环，期间事件循环可以继续处理其他文件的页面
+        
+        Args:
+            get_browser: 返回异步API浏览器实例的协程函数，只在未命中缓存、需要实际转换时调用
+            progress_cb: 进度回调（可选），与convert()相同；命中缓存和清理时会在线程池中调用
         """
+        report = self._reporter(progress_cb)
+        loop = asyncio.get_running_loop()
+        
         try:
-            print(f"开始转换: {self.input_file}")
-            print(f"输出路径: {self.output_file}")
+            report('start', f"开始转换: {self.input_file}")
+            report('start', f"输出路径: {self.output_file}")
             
-            # 1. 转换为HTML
-            html_path = self.convert_to_html()
-            print(f"已生成临时HTML文件: {html_path}")
+            # 0. 命中缓存时直接复制PDF
+            if await loop.run_in_executor(None, self._serve_from_cache, report):
+                return True
+            
+            # 1. 在线程池中渲染HTML
+            body, resources = await loop.run_in_executor(None, self.render_html)
+            report('html', f"已生成HTML: {self.input_file.stem}")
             
             # 2. HTML转换为PDF
-            print("正在使用Playwright生成PDF...")
-            self.html_to_pdf(html_path)
-            print(f"PDF文件已生成: {self.output_file}")
+            report('pdf', "正在使用Playwright生成PDF...")
+            browser = await get_browser()
+            await self.html_to_pdf_async(browser, body, resources)
+            report('done', f"PDF文件已生成: {self.output_file}")
+            
+            # 3. 保存到缓存
+            await loop.run_in_executor(None, self.save_to_cache)
             
             return True
         
         except Exception as e:
-            print(f"转换失败: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            self._report_failure(e)
             return False
         
         finally:
-            # 清理临时文件
-            if self.temp_dir and Path(self.temp_dir).exists():
+            # 没有写过临时文件（直接用set_content载入）时无需清理
+            if self.temp_dir:
+                await loop.run_in_executor(None, self._cleanup, report)
+    
+    def _serve_from_cache(self, report):
+        """
+        命中转换缓存时直接把缓存的PDF复制到输出路径
+        
+        Returns:
+            是否命中缓存
+        """
+        try:
+            fast_copy(self.cache_path, self.output_file)
+        except FileNotFoundError:
+            # 未命中，或缓存条目刚被并发转换的LRU清理删除，按正常流程转换
+            return False
+        with contextlib.suppress(OSError):
+            os.utime(self.cache_path)  # 刷新使用时间，供LRU清理判断
+        report('done', f"命中转换缓存，PDF文件已生成: {self.output_file}")
+        return True
+    
+    @staticmethod
+    def _report_failure(e):
+        """
+        打印转换失败的原因和调用栈
+        """
+        print(f"转换失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+    
+    @staticmethod
+    def _reporter(progress_cb):
+        """
+        返回报告进度的函数：有回调时交给回调处理，否则直接打印
+        """
+        def report(stage, message):
+            if progress_cb:
+                progress_cb(stage, message)
+            else:
+                print(message)
+        return report
+    
+    def _cleanup(self, report):
+        """
+        清理临时文件
+        """
+        if self.temp_dir and Path(self.temp_dir).exists():
+            try:
+                shutil.rmtree(self.temp_dir)
+                report('cleanup', f"已清理临时文件: {self.temp_dir}")
+            except Exception as e:
+                print(f"清理临时文件失败: {str(e)}")
+
+async def _batch_convert_async(input_files, paper_size, orientation, concurrency):
+    """
+    batch_convert的异步实现：所有文件共用一个浏览器，每个文件使用各自的页面
+    
+    浏览器在第一个需要实际转换的文件用到时才启动，全部命中缓存时不启动；
+    启动失败时，需要浏览器的文件各自记为转换失败
+    """
+    results = {}
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    launch_task = None
+    
+    async with contextlib.AsyncExitStack() as stack:
+        async def start_browser():
+            p = await stack.enter_async_context(async_playwright())
+            browser = await launch_browser(p)
+            stack.push_async_callback(browser.close)
+            return browser
+        
+        async def get_browser():
+            # 所有文件等待同一个启动任务，浏览器只启动一次，启动失败的异常也会传给每个等待者
+            nonlocal launch_task
+            if launch_task is None:
+                launch_task = asyncio.ensure_future(start_browser())
+            return await launch_task
+        
+        async def convert_one(input_file):
+            async with semaphore:
                 try:
-                    shutil.rmtree(self.temp_dir)
-                    print(f"已清理临时文件: {self.temp_dir}")
-                except Exception as e:
-                    print(f"清理临时文件失败: {str(e)}")
+                    converter = IPYNBtoPDFConverter(input_file, paper_size=paper_size, orientation=orientation)
+                except FileNotFoundError as e:
+                    print(f"转换失败: {str(e)}")
+                    results[input_file] = False
+                    return
+                converter.cache_max_entries = max(CACHE_MAX_ENTRIES, len(input_files))
+                results[input_file] = await converter.convert_async(get_browser)
+        
+        await asyncio.gather(*(convert_one(f) for f in input_files))
+    
+    # 按输入顺序返回
+    return {f: results[f] for f in input_files}
+
+def batch_convert(input_files, paper_size="A3", orientation="portrait", concurrency=4):
+    """
+    批量转换多个notebook，输出到各自同目录下的同名PDF
+    
+    使用Playwright异步API：只启动一个浏览器，最多concurrency个文件同时转换，
+    一个文件在浏览器中排版时，其他文件的HTML渲染和PDF生成可以同时进行
+    
+    Args:
+        input_files: 输入的ipynb文件路径列表
+        paper_size: 纸张大小
+        orientation: 纸张方向
+        concurrency: 同时进行转换的数量
+    
+    Returns:
+        字典，键为输入文件路径，值为是否转换成功
+    """
+    return asyncio.run(_batch_convert_async(input_files, paper_size, orientation, concurrency))
 
 def main():
     """
     主函数，处理命令行参数并执行转换
     """
     parser = argparse.ArgumentParser(description='Jupyter Notebook 到 PDF 转换工具')
-    parser.add_argument('input_file', help='输入的Jupyter Notebook文件路径')
-    parser.add_argument('-o', '--output_file', help='输出的PDF文件路径（可选）')
+    parser.add_argument('input_files', nargs='+', metavar='input_file',
+                        help='输入的Jupyter Notebook文件路径，指定多个（或使用通配符）时批量转换')
+    parser.add_argument('-o', '--output_file', help='输出的PDF文件路径（可选，仅转换单个文件时有效）')
     parser.add_argument('--paper', default='A3', help='纸张大小，默认为A3')
     parser.add_argument('--orientation', default='portrait', choices=['portrait', 'landscape'],
                         help='纸张方向，portrait(竖版)或landscape(横版)，默认为竖版')
+    parser.add_argument('-j', '--jobs', type=int, default=4,
+                        help='批量转换时同时进行的转换数量，默认为4')
     
     args = parser.parse_args()
     
+    # 展开通配符（Windows命令行不会自动展开）
+    input_files = []
+    for pattern in args.input_files:
+        if glob.has_magic(pattern):
+            input_files.extend(sorted(glob.glob(pattern)))
+        else:
+            input_files.append(pattern)
+    
+    if not input_files:
+        parser.error('没有找到匹配的输入文件')
+    
+    if len(input_files) > 1:
+        if args.output_file:
+            parser.error('批量转换时不能指定 --output_file，PDF将输出到各notebook所在目录')
+        
+        # 批量转换
+        results = batch_convert(input_files, args.paper, args.orientation, args.jobs)
+        failed = [f for f, ok in results.items() if not ok]
+        print(f"批量转换完成: 成功 {len(results) - len(failed)} 个，失败 {len(failed)} 个")
+        for f in failed:
+            print(f"  转换失败: {f}")
+        sys.exit(0 if not failed else 1)
+    
     # 创建转换器实例
     converter = IPYNBtoPDFConverter(
-        input_file=args.input_file,
+        input_file=input_files[0],
         output_file=args.output_file,
         paper_size=args.paper,
         orientation=args.orientation
@@ -1,12 +1,16 @@
+import io
 import os
+import contextlib
 import re
-import math
-import argparse
+import sys
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+import PIL
 from PIL import Image
 from reportlab.lib.pagesizes import A4, A3, A5, landscape
-from reportlab.pdfgen import canvas
 from reportlab.lib.units import mm
-from reportlab.lib.utils import ImageReader
 
 # 超参数配置
 PDF_MARGIN_LEFT = 15  # PDF左侧空隙（mm）
@@ -18,18 +22,44 @@ PDF_PAGE_SIZE = A4  # PDF页面大小选项：A4, A3, A5, 或 landscape(A4), lan
 #OUTPUT_PDF = r"C:\Users\53108\Desktop\开发inbpy转pdf项目\test\test.pdf"  # 输出PDF文件名(测试用的)
 INPUT_FOLDER = r"E:\Python_materials\大模型原理正课\part3 deepseek及其预训练\deepseekv3原理"  # 输入图片文件夹路径
 OUTPUT_PDF = r"E:\Python_materials\大模型原理正课\part3 deepseek及其预训练\deepseekv3原理\deepseekv3.pdf"  # 输出PDF文件名
-USER_SPECIFIED_SLICES = 3500  # 用户指定的切片数量（可选，设置为整数或None自动计算）
+PACK_PAGES = True  # 是否将图片逐张缩放后直接排入PDF页面（只在页面放不下时切开）；设为False或指定--slices时使用合并长图再切片的方式
+USER_SPECIFIED_SLICES = 3500  # 用户指定的切片数量（可选，设置为整数或None自动计算；仅在切片方式下使用）
+VERBOSE = False  # 是否输出每张图片、每个切片的详细信息（图片很多时逐条打印会明显拖慢处理速度），也可用--verbose开启
+JPEG_QUALITY = 85  # 图片写入PDF时的JPEG质量（1-95），越高越清晰、PDF越大
+RESAMPLE_FILTER = Image.BICUBIC  # 缩放算法：缩小截图时BICUBIC与LANCZOS效果相近但更快，需要更高质量时可改为Image.LANCZOS
 
+# 支持的图片扩展名，以及从文件名中提取数字的正则表达式（用于排序）
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.gif'}
+_DIGITS = re.compile(r'\d+')
 
+# Pillow-SIMD的版本号带有".postN"后缀；它的缩放在释放GIL后用SIMD指令执行，用线程并行即可，无需启动进程
+PILLOW_SIMD = 'post' in PIL.__version__
 
-def read_image(image_path):
+
+
+def vprint(*args, **kwargs):
+    """
+    只在详细输出模式下打印，用于循环中逐张图片、逐个切片的信息
+    """
+    if VERBOSE:
+        print(*args, **kwargs)
+
+
+def read_image(image_path, target_size=None):
     """
     读取图片文件
     :param image_path: 图片文件路径
+    :param target_size: 随后要缩放到的 (宽, 高)（可选）。JPEG图片解码时会直接按1/2、1/4、1/8缩小，
+                        但保留至少2倍于该尺寸的分辨率以保证缩放质量；其他格式不受影响
     :return: PIL.Image对象
     """
     try:
         img = Image.open(image_path)
+        # Image.open只读取了文件头，draft必须在解码像素数据之前调用
+        if target_size and img.format == 'JPEG':
+            img.draft('RGB', (target_size[0] * 2, target_size[1] * 2))
+        # 在这里解码像素数据，损坏或截断的图片才会被下面捕获，而不是在之后缩放时中断整个流程
+        img.load()
         # 确保图片为RGB模式
         if img.mode != 'RGB':
             img = img.convert('RGB')
@@ -39,50 +69,11 @@ def read_image(image_path):
         return None
 
 
-def merge_images(images):
-    """
-    将所有图片按顺序合并成一个长图（不缩放）
-    :param images: PIL.Image对象列表
-    :return: 合并后的长图
-    """
-    if not images:
-        return None
-    
-    # 确保所有图片为RGB模式
-    rgb_images = []
-    for img in images:
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-        rgb_images.append(img)
-    
-    # 计算合并后的长图尺寸（宽度取所有图片的最大宽度，高度累加）
-    max_width = max(img.width for img in rgb_images)
-    total_height = sum(img.height for img in rgb_images)
-    
-    # 创建合并后的长图（使用白色背景）
-    merged_img = Image.new('RGB', (max_width, total_height), color=(255, 255, 255))
-    
-    # 将所有图片粘贴到长图中（从上到下顺序，居中对齐）
-    current_y = 0
-    for idx, img in enumerate(rgb_images):
-        img_width, img_height = img.size
-        print(f"  图片 {idx+1} 尺寸: {img_width}px × {img_height}px")
-        
-        # 居中对齐（左右居中）
-        x_offset = (max_width - img_width) // 2
-        merged_img.paste(img, (x_offset, current_y))
-        current_y += img_height
-    
-    print(f"合并后的长图尺寸: {merged_img.width}px × {merged_img.height}px")
-    return merged_img
-
-
-def calculate_scaled_size(merged_img, pdf_width_mm):
+def calculate_target_width(pdf_width_mm):
     """
-    计算长图在宽铺满PDF时的尺寸
-    :param merged_img: 合并后的长图
+    计算长图在宽铺满PDF时的像素宽度
     :param pdf_width_mm: PDF页面宽度（mm）
-    :return: 缩放后的长图，缩放比例
+    :return: 目标宽度（像素）
     """
     # 使用300dpi作为PDF的标准分辨率
     dpi = 300
@@ -90,35 +81,197 @@ def calculate_scaled_size(merged_img, pdf_width_mm):
     # 计算PDF页面的有效宽度（减去左右空隙）
     available_pdf_width_mm = pdf_width_mm - PDF_MARGIN_LEFT - PDF_MARGIN_RIGHT
     # 转换为像素
-    target_width_px = int(round(available_pdf_width_mm * dpi / 25.4))
+    target_width_px = max(1, int(round(available_pdf_width_mm * dpi / 25.4)))
     
     print(f"PDF页面宽度: {pdf_width_mm:.2f}mm")
     print(f"两侧空隙: 左 {PDF_MARGIN_LEFT}mm + 右 {PDF_MARGIN_RIGHT}mm = {PDF_MARGIN_LEFT + PDF_MARGIN_RIGHT}mm")
     print(f"图片目标宽度: {target_width_px}px (将铺满PDF有效区域)")
     
-    # 计算缩放比例
-    scale_ratio = target_width_px / max(1, merged_img.width)
+    return target_width_px
+
+
+def load_scaled_image(image_path, scaled_w, scaled_h):
+    """
+    读取图片并缩放到指定尺寸
+    :param image_path: 图片文件路径
+    :param scaled_w: 缩放后的宽度（像素）
+    :param scaled_h: 缩放后的高度（像素）
+    :return: 缩放后的图片数组，形状为(高, 宽, 3)；读取失败时返回None
+    """
+    img = read_image(image_path, target_size=(scaled_w, scaled_h))
+    if img is None:
+        return None
+    # read_image已转换为RGB，这里不再重复转换；写入长图要求数组为(高, 宽, 3)
+    assert img.mode == 'RGB', f"read_image返回了{img.mode}模式的图片"
+    return np.asarray(img.resize((scaled_w, scaled_h), RESAMPLE_FILTER))
+
+
+def iter_scaled_images(layout):
+    """
+    按顺序逐张产出缩放后的图片，后台线程同时解码、缩放后面的图片
+    
+    Pillow解码和缩放时会释放GIL，多个线程可以同时进行；
+    最多提前处理CPU核数张图片，避免所有图片同时占用内存
+    :param layout: plan_layout返回的布局列表
+    :return: 依次产出 (布局项, 缩放后的图片数组或None) 的生成器
+    """
+    max_workers = os.cpu_count() or 1
+    layout_iter = iter(layout)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        def submit_next():
+            item = next(layout_iter, None)
+            if item is not None:
+                image_path, _, scaled_w, scaled_h = item
+                pending.append((item, executor.submit(load_scaled_image, image_path, scaled_w, scaled_h)))
+        
+        for _ in range(max_workers):
+            submit_next()
+        while pending:
+            item, future = pending.popleft()
+            submit_next()
+            yield item, future.result()
+
+
+def plan_layout(image_paths, target_w):
+    """
+    计算每张图片缩放后的尺寸及其在长图中的位置（只读取文件头，不解码像素数据）
+    
+    与先合并再整体缩放相同：宽度取所有图片的最大宽度，按同一比例缩放，较窄的图片左右居中
+    :param image_paths: 图片文件路径列表
+    :param target_w: 长图的目标宽度（像素）
+    :return: (图片路径, 顶部位置, 缩放后宽度, 缩放后高度) 的列表，以及长图总高度
+    """
+    sizes = []
+    for image_path in image_paths:
+        try:
+            with Image.open(image_path) as img:
+                sizes.append((image_path, img.size))
+        except Exception as e:
+            print(f"读取图片失败 {image_path}: {e}")
+    
+    if not sizes:
+        return [], 0
+    
+    max_width = max(width for _, (width, _) in sizes)
+    scale_ratio = target_w / max_width
     print(f"缩放比例: {scale_ratio:.4f}")
     
-    # 计算缩放后的尺寸
-    scaled_width = int(round(merged_img.width * scale_ratio))
-    scaled_height = int(round(merged_img.height * scale_ratio))
+    layout = []
+    total_height = 0
+    for image_path, (width, height) in sizes:
+        scaled_w = min(target_w, max(1, int(round(width * scale_ratio))))
+        scaled_h = max(1, int(round(height * scale_ratio)))
+        layout.append((image_path, total_height, scaled_w, scaled_h))
+        total_height += scaled_h
     
-    # 确保缩放后的尺寸至少为1像素
-    scaled_width = max(1, scaled_width)
-    scaled_height = max(1, scaled_height)
+    return layout, total_height
+
+
+def _resize_into_memmap(memmap_path, shape, image_path, top, scaled_w, scaled_h):
+    """
+    解码并缩放一张图片，写入长图内存映射文件中对应的位置（在工作进程或线程中运行）
+    :param memmap_path: 内存映射文件路径
+    :param shape: 长图数组的形状
+    :param image_path: 图片文件路径
+    :param top: 图片在长图中的顶部位置（像素）
+    :param scaled_w: 缩放后的宽度（像素）
+    :param scaled_h: 缩放后的高度（像素）
+    :return: 是否成功
+    """
+    resized = load_scaled_image(image_path, scaled_w, scaled_h)
+    if resized is None:
+        return False
+    
+    # 各任务写入长图中互不重叠的区域，可以同时打开同一个文件
+    scaled = np.memmap(memmap_path, dtype=np.uint8, mode='r+', shape=shape)
+    x_offset = (shape[1] - scaled_w) // 2
+    scaled[top:top + scaled_h, x_offset:x_offset + scaled_w] = resized
+    scaled.flush()
+    return True
+
+
+def build_scaled_memmap(image_paths, target_w):
+    """
+    将所有图片按顺序缩放并拼接成宽铺满PDF的长图，直接写入磁盘上的内存映射数组
     
-    # 使用高质量的缩放算法
-    scaled_img = merged_img.resize((scaled_width, scaled_height), Image.LANCZOS)
-    print(f"📏 缩放后的长图尺寸: {scaled_width}px × {scaled_height}px")
+    不再先在内存中合并出原尺寸的长图再整体缩放：第一遍只读取图片尺寸，
+    第二遍把每张图片的解码和缩放分给多个进程并行执行，各自写入长图中对应的位置
+    :param image_paths: 图片文件路径列表
+    :param target_w: 长图的目标宽度（像素）
+    :return: (长图数组 np.memmap，形状为(高, 宽, 3)；成功读取的每张图片缩放后的高度列表)，没有可用图片时返回 (None, [])
+    """
+    # 第一遍：只读取图片尺寸
+    layout, total_height = plan_layout(image_paths, target_w)
+    if not layout:
+        return None, []
+    
+    # 在临时目录创建内存映射文件（使用白色背景）
+    fd, memmap_path = tempfile.mkstemp(suffix='.raw', prefix='img2pdf_')
+    os.close(fd)
+    scaled = np.memmap(memmap_path, dtype=np.uint8, mode='w+', shape=(total_height, target_w, 3))
+    # 调用方只有拿到返回值后才会释放临时文件，这里出错（包括Ctrl-C）时需自行删除，避免留下整张长图
+    try:
+        scaled[:] = 255
+        scaled.flush()
+
+        # 第二遍：并行解码、缩放并写入长图中对应的位置
+        executor_class = ThreadPoolExecutor if PILLOW_SIMD else ProcessPoolExecutor
+        max_workers = min(os.cpu_count() or 1, len(layout))
+        with executor_class(max_workers=max_workers) as executor:
+            futures = [executor.submit(_resize_into_memmap, memmap_path, scaled.shape, *item) for item in layout]
+            succeeded = []
+            for idx, ((_, _, scaled_w, scaled_h), future) in enumerate(zip(layout, futures)):
+                succeeded.append(future.result())
+                if succeeded[-1]:
+                    vprint(f"  图片 {idx+1} 缩放后尺寸: {scaled_w}px × {scaled_h}px")
+
+        # 文件头正常但解码失败的图片已预留了位置：把后面的图片依次上移，不在PDF中留下空白
+        heights = []
+        new_height = 0
+        for (_, top, _, scaled_h), ok in zip(layout, succeeded):
+            if not ok:
+                continue
+            if top != new_height:
+                scaled[new_height:new_height + scaled_h] = scaled[top:top + scaled_h]
+            heights.append(scaled_h)
+            new_height += scaled_h
+    except BaseException:
+        scaled = None  # 释放对长图数组的引用，映射随之关闭
+        release_memmap(memmap_path)
+        raise
+
+    if new_height < total_height:
+        # 截掉末尾多余的部分，重新按实际高度映射（Windows下需先释放映射才能截断或删除文件）
+        scaled.flush()
+        del scaled
+        if not heights:
+            release_memmap(memmap_path)
+            return None, []
+        os.truncate(memmap_path, new_height * target_w * 3)
+        scaled = np.memmap(memmap_path, dtype=np.uint8, mode='r+', shape=(new_height, target_w, 3))
+
+    print(f"📏 缩放后的长图尺寸: {target_w}px × {new_height}px")
+    return scaled, heights
+
+
+def release_memmap(memmap_path):
+    """
+    删除长图的内存映射临时文件
     
-    return scaled_img, scale_ratio
+    Windows下文件仍被映射时无法删除：调用前需先删除对长图数组的所有引用，映射随最后一个引用一起关闭
+    :param memmap_path: 内存映射文件路径（长图数组的filename属性）
+    """
+    try:
+        os.remove(memmap_path)
+    except OSError as e:
+        print(f"删除临时文件失败 {memmap_path}: {e}")
 
 
-def calculate_min_slices(scaled_img, pdf_height_mm):
+def calculate_min_slices(scaled_height, pdf_height_mm):
     """
     计算最少需要的切片数量
-    :param scaled_img: 缩放后的长图
+    :param scaled_height: 缩放后的长图高度（像素）
     :param pdf_height_mm: PDF页面高度（mm）
     :return: 最少切片数量
     """
@@ -135,7 +288,7 @@ def calculate_min_slices(scaled_img, pdf_height_mm):
     print(f"每页最大图片高度: {available_height_px}px (将完整显示在PDF页面中)")
     
     # 计算最少需要的切片数量
-    min_slices = max(1, int(math.ceil(scaled_img.height / available_height_px)))
+    min_slices = max(1, (scaled_height + available_height_px - 1) // available_height_px)
     print(f"🔢 最少需要的切片数量: {min_slices}")
     
     return min_slices
@@ -144,14 +297,14 @@ def calculate_min_slices(scaled_img, pdf_height_mm):
 def split_image(merged_img, num_slices):
     """
     将长图按高的方向切分成若干个小图
-    :param merged_img: 合并并缩放后的长图
+    :param merged_img: 合并并缩放后的长图数组
     :param num_slices: 切片数量
-    :return: 切片列表
+    :return: 切片的 (顶部, 底部) 像素位置列表，只记录位置，不复制图片数据
     """
-    if not merged_img or num_slices <= 0:
+    if merged_img is None or num_slices <= 0:
         return []
     
-    img_width_px, img_height_px = merged_img.size
+    img_height_px, img_width_px = merged_img.shape[:2]
     print(f"将长图切分成 {num_slices} 个小图")
     
     # 计算每个切片的高度（确保切片高度尽可能均匀）
@@ -159,35 +312,71 @@ def split_image(merged_img, num_slices):
     remainder = img_height_px % num_slices
     print(f"每个切片的高度: {slice_height}px (最后一个切片会多出 {remainder}px)")
     
-    # 切分长图
-    slices = []
-    current_top = 0
+    # 一次性计算所有切片的位置：前remainder个切片各多分1px，累加高度得到各切片的底部位置
+    heights = np.full(num_slices, slice_height, dtype=np.int64)
+    heights[:remainder] += 1
+    bottoms = np.cumsum(heights)
+    slices = list(zip((bottoms - heights).tolist(), bottoms.tolist()))
     
-    for i in range(num_slices):
-        # 计算切片的顶部和底部位置
-        top = current_top
-        
-        # 分配剩余高度
-        if i == num_slices - 1:
-            bottom = img_height_px
-        else:
-            bottom = top + slice_height + (1 if i < remainder else 0)
-        
-        # 裁剪切片
-        slice_img = merged_img.crop((0, top, img_width_px, bottom))
-        slices.append(slice_img)
-        
-        print(f"  切片 {i+1}: 顶部 {top}px - 底部 {bottom}px, 尺寸: {slice_img.width}px × {slice_img.height}px")
-        
-        # 更新当前顶部位置
-        current_top = bottom
+    if VERBOSE:
+        for i, (top, bottom) in enumerate(slices):
+            vprint(f"  切片 {i+1}: 顶部 {top}px - 底部 {bottom}px, 尺寸: {img_width_px}px × {bottom - top}px")
     
     return slices
 
-def create_pdf(slices, output_path):
+def to_image_reader(img_array, jpeg_buffer):
+    """
+    将图片数组编码为JPEG后包装为ImageReader，PDF中直接保存JPEG数据，不再由reportlab重新编码
+    :param img_array: 图片数组，形状为(高, 宽, 3)
+    :param jpeg_buffer: 复用的BytesIO缓冲区；drawImage会立即读取其中的JPEG数据，绘制完成后即可用于下一张图片
+    :return: ImageReader对象
+    """
+    from reportlab.lib.utils import ImageReader
+    
+    jpeg_buffer.seek(0)
+    jpeg_buffer.truncate(0)
+    Image.fromarray(img_array).save(jpeg_buffer, 'JPEG', quality=JPEG_QUALITY, optimize=False, progressive=False)
+    jpeg_buffer.seek(0)
+    return ImageReader(jpeg_buffer)
+
+
+@contextlib.contextmanager
+def binary_pdf_streams():
+    """
+    生成PDF期间关闭reportlab的ASCII85编码，JPEG数据按二进制原样保存，省去一次编码并减小约20%的体积
+    
+    该选项是reportlab的全局配置，绘制图片和保存PDF时都会读取，因此在整个生成过程中保持关闭，
+    结束后恢复原值，不影响同一进程中reportlab的其他使用者；也可作为装饰器使用
+    """
+    from reportlab import rl_config
+    
+    saved = rl_config.useA85
+    rl_config.useA85 = 0
+    try:
+        yield
+    finally:
+        rl_config.useA85 = saved
+
+
+def new_canvas(output_path):
+    """
+    创建PDF画布（reportlab只在生成PDF时才导入）
+    
+    图片都以JPEG（DCT）数据直接写入PDF，不透明，无需mask
+    :param output_path: 输出PDF文件路径
+    :return: reportlab的Canvas对象
+    """
+    from reportlab.pdfgen import canvas
+    
+    return canvas.Canvas(output_path, pagesize=PDF_PAGE_SIZE)
+
+
+@binary_pdf_streams()
+def create_pdf(img_array, slices, output_path):
     """
     创建PDF文件并插入图片切片
-    :param slices: 图片切片列表
+    :param img_array: 合并并缩放后的长图数组
+    :param slices: split_image返回的切片位置列表
     :param output_path: 输出PDF文件路径
     :return: 生成的PDF页数
     """
@@ -202,7 +391,7 @@ def create_pdf(slices, output_path):
     print(f"PDF页面尺寸: {page_width}pt × {page_height}pt")
     
     # 创建PDF画布
-    c = canvas.Canvas(output_path, pagesize=PDF_PAGE_SIZE)
+    c = new_canvas(output_path)
     
     # 将mm转换为点（reportlab的单位）
     margin_left_pt = PDF_MARGIN_LEFT * mm
@@ -216,93 +405,201 @@ def create_pdf(slices, output_path):
     available_height_pt = page_height - margin_top_pt - margin_bottom_pt
     print(f"PDF中图片可用尺寸: {available_width_pt}pt × {available_height_pt}pt")
     
+    # 同一页上的切片在长图中是连续的，合并为一张图片绘制，每页只嵌入一个图片对象
+    jpeg_buffer = io.BytesIO()
+    band = []  # 当前页待绘制的 [长图中的顶部, 长图中的底部, PDF中的底部位置]
+    
+    # 所有切片宽度相同，缩放比例只需计算一次（宽度铺满可用区域）
+    slice_width_px = img_array.shape[1]
+    scale_ratio = available_width_pt / slice_width_px
+    slice_width_pt = available_width_pt
+    
+    def draw_band():
+        if not band:
+            return
+        band_top, band_bottom, band_y = band
+        img_reader = to_image_reader(img_array[band_top:band_bottom], jpeg_buffer)
+        band_height_pt = (band_bottom - band_top) * scale_ratio
+        c.drawImage(img_reader, margin_left_pt, band_y, width=available_width_pt, height=band_height_pt,
+                    preserveAspectRatio=True)
+        band.clear()
+    
     # 开始绘制图片
     page_count = 1  # 页面计数
     current_y = page_height - margin_top_pt  # 当前页可用的顶部位置
     
-    for slice_idx, slice_img in enumerate(slices):
-        # 获取切片尺寸
-        slice_width_px, slice_height_px = slice_img.size
-        
-        # 计算切片在PDF中的显示尺寸（宽度铺满可用区域）
-        scale_ratio = available_width_pt / slice_width_px
-        slice_width_pt = available_width_pt
+    for slice_idx, (top, bottom) in enumerate(slices):
+        # 计算切片在PDF中的显示尺寸
+        slice_height_px = bottom - top
         slice_height_pt = slice_height_px * scale_ratio
         
-        print(f"\n处理切片 {slice_idx+1}:")
-        print(f"  切片尺寸: {slice_width_px}px × {slice_height_px}px")
-        print(f"  在PDF中的显示尺寸: {slice_width_pt:.2f}pt × {slice_height_pt:.2f}pt")
+        vprint(f"\n处理切片 {slice_idx+1}:")
+        vprint(f"  切片尺寸: {slice_width_px}px × {slice_height_px}px")
+        vprint(f"  在PDF中的显示尺寸: {slice_width_pt:.2f}pt × {slice_height_pt:.2f}pt")
         
         # 检查当前页是否能容纳这个切片
         if current_y - slice_height_pt < margin_bottom_pt:
-            # 页放不下，创建新页面
+            # 页放不下，先绘制当前页的切片，再创建新页面
+            draw_band()
             c.showPage()
             page_count += 1
             current_y = page_height - margin_top_pt  # 重置当前页的顶部位置
-            print(f"  当前页放不下，创建新页面 (PDF第 {page_count} 页)")
+            vprint(f"  当前页放不下，创建新页面 (PDF第 {page_count} 页)")
         
         # 计算切片在PDF中的位置
         x = margin_left_pt  # 左侧边距
         y = current_y - slice_height_pt  # 当前位置下方开始
         
-        print(f"  在PDF中的位置: x={x:.2f}pt, y={y:.2f}pt (PDF第 {page_count} 页)")
-        
-        # 将图片转换为ImageReader
-        img_reader = ImageReader(slice_img)
+        vprint(f"  在PDF中的位置: x={x:.2f}pt, y={y:.2f}pt (PDF第 {page_count} 页)")
         
-        # 绘制图片
-        c.drawImage(img_reader, x, y, width=slice_width_pt, height=slice_height_pt, preserveAspectRatio=True, mask='auto')
+        # 并入当前页待绘制的图片（切片直接取长图数组的行视图，换页时再绘制）
+        if band:
+            band[1:] = [bottom, y]
+        else:
+            band[:] = [top, bottom, y]
         
         # 更新当前页可用的顶部位置
         current_y = y
     
+    draw_band()
+    
     # 保存PDF文件
     c.save()
     print(f"\nPDF文件已成功保存到: {output_path}")
     return page_count
 
 
+@binary_pdf_streams()
+def pack_images_to_pdf(image_paths, target_w, output_path):
+    """
+    将图片逐张缩放到PDF宽度后按顺序直接排入PDF页面，只在当前页放不下时把图片切开续到下一页
+    
+    不再合并出完整的长图、也不需要切片：每张图片只占用一次内存，绘制次数约为图片数加换页次数
+    :param image_paths: 图片文件路径列表
+    :param target_w: 图片铺满PDF有效宽度时的像素宽度
+    :param output_path: 输出PDF文件路径
+    :return: (生成的PDF页数, 处理的图片数量)
+    """
+    layout, total_height = plan_layout(image_paths, target_w)
+    if not layout:
+        print("错误：没有可处理的图片")
+        return 0, 0
+    print(f"📏 缩放后的图片总尺寸: {target_w}px × {total_height}px")
+    
+    page_width, page_height = PDF_PAGE_SIZE
+    c = new_canvas(output_path)
+    
+    # 计算PDF中图片的可用尺寸，以及每个像素对应的点数
+    margin_left_pt = PDF_MARGIN_LEFT * mm
+    page_top_pt = page_height - PDF_MARGIN_TOP * mm
+    available_width_pt = page_width - margin_left_pt - PDF_MARGIN_RIGHT * mm
+    available_height_pt = page_top_pt - PDF_MARGIN_BOTTOM * mm
+    pt_per_px = available_width_pt / target_w
+    # 每页可放下的像素行数
+    page_rows = max(1, int(available_height_pt / pt_per_px))
+    print(f"每页最大图片高度: {page_rows}px")
+    
+    jpeg_buffer = io.BytesIO()
+    page_count = 1
+    page_cursor = 0  # 当前页已使用的像素行数
+    image_count = 0
+    
+    for idx, ((_, _, scaled_w, scaled_h), resized) in enumerate(iter_scaled_images(layout)):
+        if resized is None:
+            continue
+        image_count += 1
+        x = margin_left_pt + (target_w - scaled_w) // 2 * pt_per_px
+        
+        row = 0
+        while row < scaled_h:
+            if page_cursor >= page_rows:
+                # 当前页已满，创建新页面
+                c.showPage()
+                page_count += 1
+                page_cursor = 0
+            
+            # 放入当前页剩余空间能容纳的部分
+            rows = min(page_rows - page_cursor, scaled_h - row)
+            y = page_top_pt - (page_cursor + rows) * pt_per_px
+            c.drawImage(to_image_reader(resized[row:row + rows], jpeg_buffer), x, y,
+                        width=scaled_w * pt_per_px, height=rows * pt_per_px)
+            vprint(f"  图片 {idx+1}: 第 {row}px - {row + rows}px 放入PDF第 {page_count} 页")
+            
+            page_cursor += rows
+            row += rows
+    
+    c.save()
+    print(f"\nPDF文件已成功保存到: {output_path}")
+    return page_count, image_count
+
+
 def get_sorted_images(folder_path):
     """
     从文件夹中获取按数字命名排序的图片列表
     :param folder_path: 图片文件夹路径
     :return: 图片文件路径列表
     """
-    # 获取文件夹中所有图片文件
-    image_files = []
-    valid_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.gif']
-    
-    for file_name in os.listdir(folder_path):
-        file_path = os.path.join(folder_path, file_name)
-        if os.path.isfile(file_path):
-            ext = os.path.splitext(file_name)[1].lower()
-            if ext in valid_extensions:
-                image_files.append(file_path)
-    
-    # 按文件名中的数字排序
-    def sort_key(file_path):
-        file_name = os.path.basename(file_path)
-        # 提取文件名中的所有数字并组合成一个整数
-        # 这样可以正确处理多位数的文件名，如 "10.jpg" 会排在 "2.jpg" 后面
-        numbers = re.findall(r'\d+', file_name)
-        if numbers:
-            # 将所有数字组合成一个字符串，然后转换为整数
-            return int(''.join(numbers))
-        return 0
-    
-    sorted_files = sorted(image_files, key=sort_key)
+    # 获取文件夹中所有图片文件，并按文件名中的数字排序
+    # 提取文件名中的所有数字组合成一个整数，这样可以正确处理多位数的文件名，如 "10.jpg" 会排在 "2.jpg" 后面
+    # os.scandir返回的条目自带文件类型信息，不必再逐个stat；排序键对每个文件只计算一次
+    keyed_files = []
+    with os.scandir(folder_path) as entries:
+        for entry in entries:
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+                numbers = _DIGITS.findall(entry.name)
+                keyed_files.append((int(''.join(numbers)) if numbers else 0, entry.path))
+    
+    # 数字相同时按路径排序
+    sorted_files = [file_path for _, file_path in sorted(keyed_files)]
     print(f"图片排序结果: {[os.path.basename(f) for f in sorted_files]}")
     return sorted_files
 
 
-def main():
+def print_summary(image_count, pdf_pages, num_slices=None):
     """
-    主函数
+    输出处理结果汇总
+    :param image_count: 处理的图片数量
+    :param pdf_pages: PDF页数
+    :param num_slices: 切片数量（仅切片方式）
     """
+    print()
+    print("✅ 处理完成！")
+    print(f"📄 生成的PDF文件: {OUTPUT_PDF}")
+    print(f"📁 输入图片文件夹: {INPUT_FOLDER}")
+    print(f"📏 PDF页面大小: {PDF_PAGE_SIZE.__name__ if hasattr(PDF_PAGE_SIZE, '__name__') else PDF_PAGE_SIZE}")
+    print(f"📐 边界设置: 左 {PDF_MARGIN_LEFT}mm, 右 {PDF_MARGIN_RIGHT}mm, 上 {PDF_MARGIN_TOP}mm, 下 {PDF_MARGIN_BOTTOM}mm")
+    print(f"📷 处理的图片数量: {image_count}")
+    if num_slices is not None:
+        print(f"🔢 切片数量: {num_slices}")
+    print(f"📄 PDF页数: {pdf_pages}")
+
+
+def parse_args():
+    """
+    解析命令行参数；没有命令行参数时（直接运行、按超参数配置处理）不创建参数解析器
+    :return: (--slices指定的切片数量或None, 是否指定了--verbose)
+    """
+    if len(sys.argv) <= 1:
+        return None, False
+    
+    import argparse
+    
     # 创建命令行参数解析器
     parser = argparse.ArgumentParser(description='将多张图片合并并转换为PDF文件')
-    parser.add_argument('--slices', type=int, help='指定切片数量')
+    parser.add_argument('--slices', type=int, help='指定切片数量（指定时使用合并长图再切片的方式）')
+    parser.add_argument('--verbose', action='store_true', help='输出每张图片、每个切片的详细信息')
     args = parser.parse_args()
+    return args.slices, args.verbose
+
+
+def main():
+    """
+    主函数
+    """
+    global VERBOSE
+    slices_arg, verbose = parse_args()
+    if verbose:
+        VERBOSE = True
     
     print("开始处理图片...")
     print(f"输入文件夹: {INPUT_FOLDER}")
@@ -312,6 +609,7 @@ def main():
     print(f"右边界: {PDF_MARGIN_RIGHT}mm")
     print(f"上边界: {PDF_MARGIN_TOP}mm")
     print(f"下边界: {PDF_MARGIN_BOTTOM}mm")
+    print(f"Pillow版本: {PIL.__version__}{' (Pillow-SIMD)' if PILLOW_SIMD else ''}")
     print()
     
     # 从文件夹获取按顺序排序的图片
@@ -321,20 +619,6 @@ def main():
         print(f"错误: 在文件夹 {INPUT_FOLDER} 中没有找到可处理的图片")
         return
     
-    # 读取所有输入图片
-    images = []
-    for image_path in image_paths:
-        img = read_image(image_path)
-        if img:
-            images.append(img)
-            print(f"已读取图片: {os.path.basename(image_path)}")
-    
-    if not images:
-        print("错误: 没有可处理的图片")
-        return
-    
-    print()
-    
     # 计算PDF页面尺寸（转换为mm）
     page_width, page_height = PDF_PAGE_SIZE
     page_width_mm = page_width / mm
@@ -342,95 +626,94 @@ def main():
     
     print(f"PDF页面尺寸: {page_width_mm:.2f}mm × {page_height_mm:.2f}mm")
     
-    # 将所有图片合并
-    print("正在合并所有图片...")
-    merged_img = merge_images(images)
-    
-    if not merged_img:
-        print("错误: 图片合并失败")
-        return
-    
-    print(f"合并后的长图尺寸: {merged_img.width}px × {merged_img.height}px")
-    print("图片合并完成！")
-    print()
-    
-    # 计算长图在宽铺满PDF时的尺寸
+    # 计算长图在宽铺满PDF时的宽度
     print("正在计算长图在宽铺满PDF时的尺寸...")
-    scaled_img, scale_ratio = calculate_scaled_size(merged_img, page_width_mm)
-    
-    if not scaled_img:
-        print("错误: 长图缩放失败")
-        return
-    
-    print("长图尺寸计算完成！")
+    target_width_px = calculate_target_width(page_width_mm)
     print()
     
-    # 计算最少需要的切片数量
-    print("正在计算最少需要的切片数量...")
-    min_slices = calculate_min_slices(scaled_img, page_height_mm)
-    
-    print("最少切片数量计算完成！")
-    print()
-    
-    # 获取用户指定的切片数量
-    num_slices = USER_SPECIFIED_SLICES
-    
-    # 优先使用命令行参数
-    if args.slices is not None:
-        num_slices = args.slices
-    
-    # 如果没有通过命令行参数指定，让用户交互式输入
-    if num_slices is None:
-        while True:
-            try:
-                print(f"🔢 最少需要的切片数量: {min_slices}")
-                user_input = input(f"请输入切片数量 (不低于 {min_slices}): ")
-                num_slices = int(user_input.strip())
-                if num_slices >= min_slices:
-                    break
-                else:
-                    print(f"⚠️  输入的切片数量小于最少需要的切片数量 {min_slices}")
-                    print(f"将自动使用最少切片数量: {min_slices}")
-                    num_slices = min_slices
-                    break
-            except ValueError:
-                print("❌ 请输入有效的数字！")
-                continue
-    else:
-        # 确保不低于最少切片数量
-        if num_slices < min_slices:
-            print(f"警告: 指定的切片数量 {num_slices} 小于最少需要的切片数量 {min_slices}")
-            print(f"将使用最少切片数量: {min_slices}")
-            num_slices = min_slices
-    
-    print(f"最终使用的切片数量: {num_slices}")
-    print()
-    
-    # 切分长图
-    print("正在切分长图...")
-    slices = split_image(scaled_img, num_slices)
-    
-    if not slices:
-        print("错误: 图片切分失败")
+    if PACK_PAGES and slices_arg is None:
+        # 逐张排入PDF页面，不需要合并长图和切片
+        print("正在将图片逐张排入PDF页面...")
+        pdf_pages, image_count = pack_images_to_pdf(image_paths, target_width_px, OUTPUT_PDF)
+        if not pdf_pages:
+            return
+        print_summary(image_count, pdf_pages)
         return
     
-    print("长图切分完成！")
-    print()
+    # 逐张缩放图片并拼接成长图
+    print("正在缩放并合并所有图片...")
+    scaled_img, scaled_heights = build_scaled_memmap(image_paths, target_width_px)
     
-    # 创建PDF
-    print("正在生成PDF文件...")
-    print("切片将依次添加到PDF中，确保图片内容完整显示")
-    pdf_pages = create_pdf(slices, OUTPUT_PDF)
+    if scaled_img is None:
+        print("错误: 没有可处理的图片")
+        return
     
-    print()
-    print("✅ 处理完成！")
-    print(f"📄 生成的PDF文件: {OUTPUT_PDF}")
-    print(f"📁 输入图片文件夹: {INPUT_FOLDER}")
-    print(f"📏 PDF页面大小: {PDF_PAGE_SIZE.__name__ if hasattr(PDF_PAGE_SIZE, '__name__') else PDF_PAGE_SIZE}")
-    print(f"📐 边界设置: 左 {PDF_MARGIN_LEFT}mm, 右 {PDF_MARGIN_RIGHT}mm, 上 {PDF_MARGIN_TOP}mm, 下 {PDF_MARGIN_BOTTOM}mm")
-    print(f"📷 处理的图片数量: {len(images)}")
-    print(f"🔢 切片数量: {num_slices}")
-    print(f"📄 PDF页数: {pdf_pages}")
+    memmap_path = scaled_img.filename
+    try:
+        print("图片合并完成！")
+        print()
+        
+        # 计算最少需要的切片数量
+        print("正在计算最少需要的切片数量...")
+        min_slices = calculate_min_slices(scaled_img.shape[0], page_height_mm)
+        
+        print("最少切片数量计算完成！")
+        print()
+        
+        # 获取用户指定的切片数量
+        num_slices = USER_SPECIFIED_SLICES
+        
+        # 优先使用命令行参数
+        if slices_arg is not None:
+            num_slices = slices_arg
+        
+        # 如果没有通过命令行参数指定，让用户交互式输入
+        if num_slices is None:
+            while True:
+                try:
+                    print(f"🔢 最少需要的切片数量: {min_slices}")
+                    user_input = input(f"请输入切片数量 (不低于 {min_slices}): ")
+                    num_slices = int(user_input.strip())
+                    if num_slices >= min_slices:
+                        break
+                    else:
+                        print(f"⚠️  输入的切片数量小于最少需要的切片数量 {min_slices}")
+                        print(f"将自动使用最少切片数量: {min_slices}")
+                        num_slices = min_slices
+                        break
+                except ValueError:
+                    print("❌ 请输入有效的数字！")
+                    continue
+        else:
+            # 确保不低于最少切片数量
+            if num_slices < min_slices:
+                print(f"警告: 指定的切片数量 {num_slices} 小于最少需要的切片数量 {min_slices}")
+                print(f"将使用最少切片数量: {min_slices}")
+                num_slices = min_slices
+        
+        print(f"最终使用的切片数量: {num_slices}")
+        print()
+        
+        # 切分长图
+        print("正在切分长图...")
+        slices = split_image(scaled_img, num_slices)
+        
+        if not slices:
+            print("错误: 图片切分失败")
+            return
+        
+        print("长图切分完成！")
+        print()
+        
+        # 创建PDF
+        print("正在生成PDF文件...")
+        print("切片将依次添加到PDF中，确保图片内容完整显示")
+        pdf_pages = create_pdf(scaled_img, slices, OUTPUT_PDF)
+        
+        print_summary(len(scaled_heights), pdf_pages, num_slices)
+    finally:
+        del scaled_img
+        release_memmap(memmap_path)
 
 
 if __name__ == "__main__":
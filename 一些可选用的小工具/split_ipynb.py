@@ -1,7 +1,38 @@
 import json
 import os
+from itertools import islice
 from typing import List
 
+def _json_dumps(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+
+class _NonFiniteFloat(float):
+    """标准库json解析出的NaN/Infinity；orjson无法序列化该类型，写出时会交给标准库json原样保留"""
+
+# orjson为可选依赖，读写大型Notebook（含大量base64图片输出）时更快；未安装时退回标准库json
+try:
+    import orjson
+
+    def _loads(data: bytes):
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson不接受nbformat允许写出的NaN/Infinity和超过64位的整数，交给标准库json解析
+            return json.loads(data, parse_constant=_NonFiniteFloat)
+
+    def _dumps(obj) -> bytes:
+        try:
+            # orjson总是输出UTF-8，中文不会被转义，与ensure_ascii=False一致
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+        except TypeError:
+            # 含NaN/Infinity或超过64位的整数，改用标准库json，与原文件保持一致
+            return _json_dumps(obj)
+except ImportError:
+    def _loads(data: bytes):
+        return json.loads(data)
+
+    _dumps = _json_dumps
+
 def count_cells(input_file: str) -> tuple[int, dict]:
     """
     统计ipynb文件的单元格数量，并验证文件有效性，返回单元格数和解析后的JSON数据
@@ -18,9 +49,9 @@ def count_cells(input_file: str) -> tuple[int, dict]:
     if not input_file.endswith(".ipynb"):
         raise ValueError("输入文件必须是.ipynb格式的Jupyter Notebook文件")
     # 读取并解析JSON
-    with open(input_file, "r", encoding="utf-8") as f:
+    with open(input_file, "rb") as f:
         try:
-            nb_data = json.load(f)
+            nb_data = _loads(f.read())
         except json.JSONDecodeError:
             raise ValueError("输入的ipynb文件不是有效的JSON格式，文件可能损坏")
     # 验证核心结构
@@ -67,7 +98,14 @@ def parse_custom_cells(input_str: str, total_cells: int) -> List[int]:
     assigned = sum(custom_list)
     if assigned > total_cells:
         print(f"⚠️  自定义数量总和（{assigned}）超过单元格总数（{total_cells}），将自动截断为总数！")
-        return [min(num, total_cells - sum(custom_list[:i])) for i, num in enumerate(custom_list)]
+        # 用累计值逐个截断，单元格分完后的文件记为0，不会出现负数
+        truncated = []
+        used = 0
+        for num in custom_list:
+            take = max(0, min(num, total_cells - used))
+            truncated.append(take)
+            used += take
+        return truncated
     return custom_list
 
 def calculate_distribution(total_cells: int, num_files: int = None, custom_cells: List[int] = None) -> List[int]:
@@ -110,32 +148,35 @@ def split_ipynb(nb_data: dict, distribution: List[int], output_dir: str = ".") -
     """
     os.makedirs(output_dir, exist_ok=True)
     original_cells = nb_data["cells"]
-    current_start = 0
+    # 各文件的metadata等字段相同，只序列化一次；得到的是 b'{\n  "metadata": ...\n}'，去掉开头的"{"备用
+    header = _dumps({
+        "metadata": nb_data.get("metadata", {}),
+        "nbformat": nb_data["nbformat"],
+        "nbformat_minor": nb_data["nbformat_minor"]
+    })[1:]
+    # 在同一个迭代器上依次取出各文件的单元格，整个列表只遍历一次
+    cell_iter = iter(original_cells)
     # 循环生成拆分后的文件
     for file_idx, cell_num in enumerate(distribution):
         if cell_num <= 0:
             continue
-        current_end = current_start + cell_num
-        # 防止索引越界
-        current_end = min(current_end, len(original_cells))
-        current_cells = original_cells[current_start:current_end]
-        # 构建新的Notebook数据
-        new_nb_data = {
-            "cells": current_cells,
-            "metadata": nb_data.get("metadata", {}),
-            "nbformat": nb_data["nbformat"],
-            "nbformat_minor": nb_data["nbformat_minor"]
-        }
+        current_cells = list(islice(cell_iter, cell_num))
+        # 单元格已分配完，不再生成空文件
+        if not current_cells:
+            break
+        # 构建新的Notebook数据：只序列化单元格，去掉结尾的"\n}"后与公共字段拼接，
+        # 结果与序列化完整字典相同
+        new_nb_bytes = _dumps({"cells": current_cells})[:-2] + b"," + header
         # 生成输出文件路径
         output_file = os.path.join(output_dir, f"{file_idx + 1}.ipynb")
         # 写入文件
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(new_nb_data, f, ensure_ascii=False, indent=2)
+        with open(output_file, "wb") as f:
+            f.write(new_nb_bytes)
         print(f"已生成：{output_file}（包含 {len(current_cells)} 个单元格）")
-        current_start = current_end
     # 检查是否所有单元格都被拆分
-    if current_start < len(original_cells):
-        print(f"⚠️  有{len(original_cells) - current_start}个单元格未被拆分（分配方案可能有误）")
+    leftover = sum(1 for _ in cell_iter)
+    if leftover:
+        print(f"⚠️  有{leftover}个单元格未被拆分（分配方案可能有误）")
 
 # 主程序入口
 if __name__ == "__main__":